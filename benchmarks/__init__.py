@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+#
+# Benchmarks for versioning overhead
+#
+# ------------------------------------------------
+
+
+# imports
+# -------
+import os
+import time
+import shutil
+from contextlib import contextmanager
+
+from tests import SANDBOX
+
+
+# helpers
+# -------
+@contextmanager
+def application():
+    """
+    Push testing application context with freshly created tables.
+    Benchmarks share the ``Item`` model and factories used by tests.
+    """
+    os.makedirs(SANDBOX, exist_ok=True)
+    from tests.fixtures import app, db
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+    shutil.rmtree(SANDBOX)
+    return
+
+
+@contextmanager
+def timer(results, key):
+    """
+    Store elapsed seconds for managed block in results.
+    """
+    start = time.time()
+    yield
+    results[key] = time.time() - start
+    return
@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+#
+# Run benchmark suite, writing machine-readable results.
+#
+# Usage: python -m benchmarks [-o results.json] [--quick]
+#
+# ------------------------------------------------
+
+
+# imports
+# -------
+import sys
+import json
+import platform
+import argparse
+from datetime import datetime
+
+import sqlalchemy
+import sqlalchemy_continuum
+
+import flask_continuum
+from . import bulk, history, sparse, writes
+
+
+# config
+# ------
+SUITES = dict(
+    writes=lambda quick: writes.run(100 if quick else 1000),
+    history=lambda quick: history.run((1, 10, 100) if quick else (1, 10, 100, 1000), repeat=5 if quick else 20),
+    bulk=lambda quick: bulk.run(1000 if quick else 10000),
+    sparse=lambda quick: sparse.run(20 if quick else 100),
+)
+
+
+# exec
+# ----
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run Flask-Continuum benchmarks.')
+    parser.add_argument('suites', nargs='*', help='Suites to run: {} (default: all).'.format(', '.join(sorted(SUITES))))
+    parser.add_argument('-o', '--output', default=None, help='File to write JSON results to.')
+    parser.add_argument('--quick', action='store_true', help='Run with reduced sizes.')
+    args = parser.parse_args(argv)
+    unknown = set(args.suites) - set(SUITES)
+    if unknown:
+        parser.error('unknown suites: {}'.format(', '.join(sorted(unknown))))
+
+    results = dict(
+        meta=dict(
+            version=flask_continuum.__version__,
+            python=platform.python_version(),
+            sqlalchemy=sqlalchemy.__version__,
+            sqlalchemy_continuum=sqlalchemy_continuum.__version__,
+            platform=platform.platform(),
+            timestamp=datetime.utcnow().isoformat(),
+            quick=args.quick,
+        ),
+        results={},
+    )
+    for name in args.suites or sorted(SUITES):
+        results['results'][name] = SUITES[name](args.quick)
+
+    data = json.dumps(results, indent=2, sort_keys=True)
+    if args.output is None:
+        print(data)
+    else:
+        with open(args.output, 'w') as fo:
+            fo.write(data + '\n')
+    return
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+#
+# Benchmark bulk inserts against the ORM unit of work.
+#
+# Usage: python -m benchmarks.bulk [ROWS]
+#
+# ------------------------------------------------
+
+
+# imports
+# -------
+import sys
+import json
+
+from . import application, timer
+
+
+# benchmarks
+# ----------
+def run(count=10000):
+    from tests.fixtures import db, continuum, Item
+
+    results = dict(rows=count)
+    with application():
+
+        # orm unit of work
+        with timer(results, 'orm'):
+            db.session.add_all([Item(id=idx, name='orm {}'.format(idx)) for idx in range(count)])
+            db.session.commit()
+
+        # bulk insert with versions
+        offset = count
+        with timer(results, 'bulk'):
+            continuum.bulk_insert(Item, (
+                dict(id=offset + idx, name='bulk {}'.format(idx)) for idx in range(count)
+            ))
+            db.session.commit()
+
+        results['speedup'] = results['orm'] / results['bulk']
+    return results
+
+
+# exec
+# ----
+if __name__ == '__main__':
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    print(json.dumps(run(count), indent=2))
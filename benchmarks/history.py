@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+#
+# Benchmark history reads as history depth grows.
+#
+# Usage: python -m benchmarks.history [DEPTH ...]
+#
+# ------------------------------------------------
+
+
+# imports
+# -------
+import sys
+import json
+import time
+import tracemalloc
+
+from . import application
+from tests.fixtures import db, Item, ItemFactory
+
+
+# helpers
+# -------
+def latency(func, repeat):
+    """
+    Return mean seconds per call of func over ``repeat`` calls.
+    """
+    start = time.time()
+    for _ in range(repeat):
+        func()
+    return (time.time() - start) / repeat
+
+
+def measure(depth, repeat):
+    """
+    Measure ``records`` and ``modified`` latency and memory per
+    record for an item with ``depth`` versions.
+    """
+    item = ItemFactory.create(name='history {} 0'.format(depth))
+    for idx in range(1, depth):
+        item.name = 'history {} {}'.format(depth, idx)
+        db.session.commit()
+    ident = item.id
+
+    def load():
+        db.session.expire_all()
+        return db.session.query(Item).filter_by(id=ident).one()
+
+    item = load()
+    item.records
+    result = dict(depth=depth)
+
+    def records():
+        db.session.expire(item)
+        return item.records
+    result['records'] = latency(records, repeat)
+
+    def modified():
+        db.session.expire(item)
+        return item.modified
+    result['modified'] = latency(modified, repeat)
+
+    # memory held by materialized records
+    db.session.expire_all()
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    held = item.records
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    size = sum(stat.size_diff for stat in after.compare_to(before, 'filename'))
+    result['bytes_per_record'] = size / float(len(held))
+    return result
+
+
+# benchmarks
+# ----------
+def run(depths=(1, 10, 100, 1000), repeat=20):
+    results = dict(repeat=repeat, depths=[])
+    with application():
+        for depth in depths:
+            results['depths'].append(measure(depth, repeat))
+    return results
+
+
+# exec
+# ----
+if __name__ == '__main__':
+    depths = [int(x) for x in sys.argv[1:]] or (1, 10, 100, 1000)
+    print(json.dumps(run(depths), indent=2))
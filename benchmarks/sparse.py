@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+#
+# Benchmark bytes written per update for sparse and dense versions.
+#
+# Usage: python -m benchmarks.sparse [UPDATES]
+#
+# ------------------------------------------------
+
+
+# imports
+# -------
+import sys
+import json
+
+from sqlalchemy import event
+from sqlalchemy_continuum import version_class
+
+from . import application
+from tests.fixtures import db, Document
+from flask_continuum import VersioningMixin
+
+
+# models
+# ------
+class DenseDocument(db.Model, VersioningMixin):
+    __tablename__ = 'dense_document'
+    __versioned__ = {}
+
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(255), nullable=False)
+    content = db.Column(db.Text)
+
+
+# helpers
+# -------
+def written(model, count, content):
+    """
+    Update name of a single row with large content ``count`` times,
+    returning the number of parameter bytes sent in version inserts.
+    """
+    table = version_class(model).__table__.name
+    total = dict(bytes=0)
+
+    def track(conn, cursor, statement, parameters, context, executemany):
+        if statement.startswith('INSERT INTO {}'.format(table)):
+            rows = parameters if executemany else [parameters]
+            total['bytes'] += sum(len(str(value).encode('utf-8')) for row in rows for value in row if value is not None)
+        return
+
+    obj = model(id=1, name='update 0', content=content)
+    db.session.add(obj)
+    db.session.commit()
+    event.listen(db.engine, 'before_cursor_execute', track)
+    try:
+        for idx in range(count):
+            obj.name = 'update {}'.format(idx + 1)
+            db.session.commit()
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', track)
+    return total['bytes']
+
+
+# benchmarks
+# ----------
+def run(count=100, size=10000):
+    content = 'x' * size
+    results = dict(updates=count, content=size)
+    with application():
+        results['dense'] = written(DenseDocument, count, content) / float(count)
+        results['sparse'] = written(Document, count, content) / float(count)
+        results['ratio'] = results['dense'] / results['sparse']
+    return results
+
+
+# exec
+# ----
+if __name__ == '__main__':
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    print(json.dumps(run(count), indent=2))
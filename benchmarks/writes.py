@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+#
+# Benchmark insert and update throughput with and without versioning.
+#
+# Usage: python -m benchmarks.writes [ROWS]
+#
+# ------------------------------------------------
+
+
+# imports
+# -------
+import sys
+import json
+import factory
+
+from . import application, timer
+from tests.fixtures import db, Item, ItemFactory
+
+
+# models
+# ------
+class PlainItem(db.Model):
+    __tablename__ = 'plain_item'
+
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(255), nullable=False, unique=True, index=True)
+
+
+class PlainItemFactory(factory.alchemy.SQLAlchemyModelFactory):
+
+    id = factory.Sequence(lambda x: x + 100)
+    name = factory.Sequence(lambda x: 'plain {}'.format(x))
+
+    class Meta:
+        model = PlainItem
+        sqlalchemy_session = db.session
+        sqlalchemy_session_persistence = 'commit'
+
+
+# helpers
+# -------
+def throughput(model, factory, count, results, prefix):
+    """
+    Record rows per second for committing ``count`` inserts and
+    ``count`` updates one at a time, as a web request would.
+    """
+    with timer(results, prefix + '_insert'):
+        items = [factory.create(name='{} {}'.format(prefix, idx)) for idx in range(count)]
+    with timer(results, prefix + '_update'):
+        for item in items:
+            item.name = item.name + ' updated'
+            db.session.commit()
+    for key in ('insert', 'update'):
+        results['{}_{}'.format(prefix, key)] = count / results['{}_{}'.format(prefix, key)]
+    return
+
+
+# benchmarks
+# ----------
+def run(count=1000):
+    results = dict(rows=count)
+    with application():
+        throughput(PlainItem, PlainItemFactory, count, results, 'plain')
+        throughput(Item, ItemFactory, count, results, 'versioned')
+    for key in ('insert', 'update'):
+        results[key + '_overhead'] = results['plain_' + key] / results['versioned_' + key]
+    return results
+
+
+# exec
+# ----
+if __name__ == '__main__':
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    print(json.dumps(run(count), indent=2))
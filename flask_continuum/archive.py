@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+#
+# Storing history in a separate database
+#
+# ------------------------------------------------
+
+
+# imports
+# -------
+from sqlalchemy import inspect
+from sqlalchemy.orm import Session
+from sqlalchemy_continuum import versioning_manager
+
+from .coalesce import CoalescingUnitOfWork
+from .state import component
+
+
+# archive
+# -------
+class Archive(object):
+    """
+    Placement of version tables and the transaction table on a separate
+    Flask-SQLAlchemy bind, such as an archival database, keeping history
+    out of the application database:
+
+    .. code-block:: python
+
+        app.config['SQLALCHEMY_BINDS'] = {'history': 'postgresql://archive/history'}
+        continuum = Continuum(app, db, archive='history')
+
+    Versioning tables are tagged with the bind key once mappers are
+    configured, so ``db.create_all()`` creates them in the archive
+    database and queries through the mixin are routed there. Version
+    rows are written at flush through a second session on the archive
+    connection of the flushing session, and are committed along with
+    it. As with other Flask-SQLAlchemy binds, both databases commit
+    one after the other rather than atomically.
+
+    .. note:: Set-based operations copying rows between parent and
+              version tables (``revert_to``, ``revert_transaction`` and
+              summarized pauses) aren't supported in this mode, and
+              ``user_cls`` should only be used if the user table is
+              also stored in the archive database.
+
+    Arguments:
+        bind_key (str): Flask-SQLAlchemy bind key for history tables.
+    """
+
+    def __init__(self, bind_key):
+        self.bind_key = bind_key
+        return
+
+    @property
+    def tables(self):
+        """
+        Versioning tables stored in archive database.
+        """
+        manager = versioning_manager
+        tables = [version.__table__ for version in manager.version_class_map.values()]
+        if hasattr(manager.transaction_cls, '__table__'):
+            tables.append(manager.transaction_cls.__table__)
+        return tables
+
+    def bind_tables(self):
+        """
+        Tag versioning tables with archive bind key. This runs when
+        :class:`Continuum` is initialized and whenever mappers are
+        configured afterwards, so tables are placed before they
+        are created or queried.
+        """
+        for table in self.tables:
+            table.info['bind_key'] = self.bind_key
+        return
+
+    def unbind_tables(self):
+        """
+        Remove archive bind key from versioning tables.
+        """
+        for table in self.tables:
+            if table.info.get('bind_key') == self.bind_key:
+                table.info.pop('bind_key')
+        return
+
+
+# unit of work
+# ------------
+class ArchiveUnitOfWork(CoalescingUnitOfWork):
+    """
+    SQLAlchemy-Continuum unit of work writing transaction and version
+    rows through the connection the flushing session holds for the
+    transaction table's bind, when the application of the session is
+    configured with an :class:`Archive`.
+    """
+
+    def bind_version_session(self, session):
+        """
+        Create version session on archive connection of session.
+        """
+        if self.version_session is not None or session is self.version_session:
+            return
+        if component('archive', session) is None:
+            return
+        conn = session.connection(mapper=inspect(self.manager.transaction_cls))
+        self.archive_engine = conn.engine
+        self.version_session = Session(bind=conn)
+        return
+
+    def process_before_flush(self, session):
+        if session is not self.version_session and self.is_modified(session):
+            self.bind_version_session(session)
+        return super(ArchiveUnitOfWork, self).process_before_flush(session)
+
+    def process_after_flush(self, session):
+        if session is not self.version_session and self.current_transaction:
+            self.bind_version_session(session)
+        return super(ArchiveUnitOfWork, self).process_after_flush(session)
+
+    def create_transaction(self, session):
+        self.bind_version_session(session)
+        return super(ArchiveUnitOfWork, self).create_transaction(session)
+
+    def reset(self, session=None):
+        # connections of the version session are tracked by their own
+        # unit of work, which the versioning manager doesn't release
+        engine = getattr(self, 'archive_engine', None)
+        if engine is not None:
+            manager = self.manager
+            owners = [self]
+            conn = manager.session_connection_map.pop(self.version_session, None)
+            if conn is not None:
+                owners.append(manager.units_of_work.get(conn))
+            for conn, uow in list(manager.units_of_work.items()):
+                if conn.engine is engine and any(uow is owner for owner in owners):
+                    del manager.units_of_work[conn]
+        self.archive_engine = None
+        return super(ArchiveUnitOfWork, self).reset(session)
+
+
+# helpers
+# -------
+def install(archive):
+    """
+    Place versioning tables on archive bind.
+    """
+    archive.bind_tables()
+    return
+
+
+def uninstall(archive):
+    """
+    Move versioning tables back from archive bind, after :func:`install`.
+    """
+    archive.unbind_tables()
+    return
@@ -0,0 +1,361 @@
+# -*- coding: utf-8 -*-
+#
+# Bulk operations
+#
+# ------------------------------------------------
+
+
+# imports
+# -------
+from sqlalchemy import and_, case, func, inspect, literal, not_, select, tuple_
+from sqlalchemy_continuum import Operation, version_class, versioning_manager
+from sqlalchemy_continuum.utils import end_tx_column_name, option, tx_column_name, versioned_column_properties
+
+from .cache import invalidate_all
+from .mixins import scalar_subquery, versions_at
+from .sparse import CHANGED, is_sparse
+
+
+# helpers
+# -------
+def column_defaults(model, row):
+    """
+    Fill python-side column defaults missing from row, so that
+    parent and version rows receive the same values.
+
+    Args:
+        model (type): Model class for row.
+        row (dict): Column values keyed by attribute name.
+    """
+    for prop in inspect(model).column_attrs:
+        column = prop.columns[0]
+        if prop.key in row or column.default is None:
+            continue
+        default = column.default
+        if default.is_scalar:
+            row[prop.key] = default.arg
+        elif default.is_callable:
+            row[prop.key] = default.arg(None)
+    return row
+
+
+def create_transaction(session):
+    """
+    Insert transaction row for bulk operation, returning its id.
+
+    Args:
+        session (Session): Session to insert transaction row with.
+    """
+    uow = versioning_manager.unit_of_work(session)
+    table = versioning_manager.transaction_cls.__table__
+    conn = session.connection(mapper=inspect(versioning_manager.transaction_cls))
+    result = conn.execute(table.insert(), uow.transaction_args(session))
+    return result.inserted_primary_key[0]
+
+
+def check_bind(model):
+    """
+    Assert version table for model is stored in the same database
+    as its parent table, as required by set-based operations.
+    """
+    table, vtable = inspect(model).local_table, version_class(model).__table__
+    if table.info.get('bind_key') != vtable.info.get('bind_key'):
+        raise AssertionError(
+            'Set-based versioning operations are not supported for {}, '
+            'whose versions are stored in a separate database.'.format(model.__name__))
+    return
+
+
+def member(columns, keys):
+    """
+    Return criteria matching key columns against selectable of keys.
+    """
+    if len(columns) == 1:
+        return columns[0].in_(keys)
+    return tuple_(*columns).in_(keys)
+
+
+# operations
+# ----------
+def bulk_insert(session, model, rows, batch_size=1000):
+    """
+    Insert rows for versioned model along with their version rows,
+    using executemany-sized batches and one transaction row per
+    batch. Rows should include primary key values; rows without
+    them are inserted one at a time to obtain generated keys.
+
+    Args:
+        session (Session): Session whose transaction rows are inserted in.
+        model (type): Versioned model class.
+        rows (iterable): Dictionaries of column values keyed by attribute name.
+        batch_size (int): Number of rows written per batch.
+    """
+    manager = versioning_manager
+    mapper = inspect(model)
+    version = version_class(model)
+    table, vtable = mapper.local_table, version.__table__
+    keys = [mapper.get_property_by_column(col).key for col in mapper.primary_key]
+    columns = dict((prop.key, prop.columns[0].key) for prop in mapper.column_attrs)
+    versioned = [
+        (prop.key, inspect(version).get_property(prop.key).columns[0].key)
+        for prop in versioned_column_properties(model)
+    ]
+    tx_column = manager.option(model, 'transaction_column_name')
+    op_column = manager.option(model, 'operation_type_column_name')
+    conn = session.connection(mapper=mapper)
+    vconn = session.connection(mapper=inspect(version))
+    sparse = is_sparse(model)
+    stored = ','.join(sorted(set(key for key, _ in versioned) | set(keys)))
+    invalidate_all(session)
+
+    def flush(batch):
+        tx = create_transaction(session)
+
+        # insert parent rows
+        params = [dict((columns[k], v) for k, v in row.items()) for row in batch]
+        complete = [row for row in batch if all(row.get(k) is not None for k in keys)]
+        if len(complete) == len(batch):
+            conn.execute(table.insert(), params)
+        else:
+            for row, values in zip(batch, params):
+                result = conn.execute(table.insert(), values)
+                for key, value in zip(keys, result.inserted_primary_key):
+                    row[key] = value
+
+        # insert version rows
+        versions = []
+        for row in batch:
+            values = dict((col, row.get(key)) for key, col in versioned)
+            values[tx_column] = tx
+            values[op_column] = Operation.INSERT
+            if sparse:
+                values[CHANGED] = stored
+            versions.append(values)
+        vconn.execute(vtable.insert(), versions)
+        return
+
+    count, batch = 0, []
+    for row in rows:
+        batch.append(column_defaults(model, dict(row)))
+        if len(batch) >= batch_size:
+            flush(batch)
+            count += len(batch)
+            batch = []
+    if batch:
+        flush(batch)
+        count += len(batch)
+    return count
+
+
+def version_columns(model):
+    """
+    Return parent and version tables for model, along with pairs of
+    ``(parent, version)`` columns for primary keys and versioned
+    columns, and the transaction and operation type columns.
+    """
+    mapper = inspect(model)
+    version = version_class(model)
+    table, vtable = mapper.local_table, version.__table__
+    pks = [(table.c[col.key], vtable.c[col.key]) for col in mapper.primary_key]
+    versioned = [
+        (table.c[prop.columns[0].key], vtable.c[inspect(version).get_property(prop.key).columns[0].key])
+        for prop in versioned_column_properties(model)
+    ]
+    tx_column = vtable.c[tx_column_name(model)]
+    op_column = vtable.c[option(model, 'operation_type_column_name')]
+    return table, vtable, pks, versioned, tx_column, op_column
+
+
+def record_versions(session, model, keys, tx):
+    """
+    Record current state of rows as versions of transaction ``tx``
+    using set-based statements. Existing rows get insert or update
+    versions, depending on whether they had a live version before,
+    and removed rows get delete versions. Validity ranges of superseded
+    versions are closed. Returns the number of recorded versions.
+
+    Args:
+        session (Session): Session to write versions with.
+        model (type): Versioned model class.
+        keys (Select, list): Selectable or list of primary keys for rows
+            to record versions for.
+        tx (int): Transaction id for recorded versions.
+    """
+    check_bind(model)
+    table, vtable, pks, versioned, tx_column, op_column = version_columns(model)
+    conn = session.connection(mapper=inspect(model))
+    sparse = is_sparse(model)
+    names = [vcol.key for _, vcol in versioned] + [tx_column.key, op_column.key] + ([CHANGED] if sparse else [])
+    stored = ','.join(sorted(set(prop.key for prop in versioned_column_properties(model)) | set(
+        col.key for col in inspect(model).primary_key
+    )))
+
+    def match(alias, columns):
+        return and_(*[alias.c[vcol.key] == col for (_, vcol), col in zip(pks, columns)])
+
+    # latest version prior to recorded ones, per row
+    def latest(columns):
+        return scalar_subquery(select([func.max(tx_column)]).where(and_(
+            tx_column < tx, *[vcol == col for (_, vcol), col in zip(pks, columns)]
+        )))
+
+    # record versions for existing rows
+    prior = vtable.alias()
+    previous = scalar_subquery(select([prior.c[op_column.key]]).where(and_(
+        match(prior, [col for col, _ in pks]),
+        prior.c[tx_column.key] == latest([col for col, _ in pks]),
+    )))
+    conn.execute(vtable.insert().from_select(names, select([col for col, _ in versioned] + [
+        literal(tx),
+        case([(func.coalesce(previous, Operation.DELETE) == Operation.DELETE, Operation.INSERT)],
+             else_=Operation.UPDATE),
+    ] + ([literal(stored)] if sparse else [])).where(member([col for col, _ in pks], keys))))
+
+    # record deletions for removed rows
+    current = vtable.alias()
+    columns = [current.c[vcol.key] for _, vcol in pks]
+    conn.execute(vtable.insert().from_select(names, select(
+        [current.c[vcol.key] for _, vcol in versioned] + [literal(tx), literal(Operation.DELETE)] +
+        ([current.c[CHANGED]] if sparse else [])
+    ).where(and_(
+        member(columns, keys),
+        current.c[tx_column.key] == latest(columns),
+        current.c[op_column.key] != Operation.DELETE,
+        not_(member(columns, select([col for col, _ in pks]))),
+    ))))
+
+    # close validity ranges of superseded versions
+    if option(model, 'strategy') == 'validity':
+        end_column = vtable.c[end_tx_column_name(model)]
+        conn.execute(vtable.update().where(and_(
+            tx_column < tx,
+            end_column.is_(None),
+            member([col for _, col in pks], select([col for _, col in pks]).where(tx_column == tx)),
+        )).values({end_column.key: tx}))
+
+    return conn.execute(
+        select([func.count()]).select_from(vtable).where(tx_column == tx)
+    ).scalar()
+
+
+def revert(session, model, transaction_id, keys, tx):
+    """
+    Restore rows of model to their state at ``transaction_id`` using
+    set-based statements, and record the restored rows as versions of
+    transaction ``tx``. Rows that didn't exist at ``transaction_id`` are
+    deleted, and deleted rows are re-inserted.
+
+    Args:
+        session (Session): Session to revert rows with.
+        model (type): Versioned model class.
+        transaction_id (int): Transaction id to restore rows to.
+        keys (Select): Selectable of primary keys (in the version
+            table) for rows to revert.
+        tx (int): Transaction id recorded for the revert.
+    """
+    if is_sparse(model):
+        raise AssertionError(
+            'Set-based reverts are not supported for sparse model {}. '
+            'Revert individual records instead.'.format(model.__name__))
+
+    check_bind(model)
+    version = version_class(model)
+    table, vtable, pks, versioned, tx_column, op_column = version_columns(model)
+    conn = session.connection(mapper=inspect(model))
+
+    # target state for reverted rows
+    target = versions_at(session, model, transaction_id).filter(
+        getattr(version, op_column.key) != Operation.DELETE,
+        member([getattr(version, col.key) for _, col in pks], keys),
+    ).subquery()
+    restored = select([target.c[col.key] for _, col in pks])
+
+    # restore parent rows
+    conn.execute(table.delete().where(and_(
+        member([col for col, _ in pks], keys),
+        not_(member([col for col, _ in pks], restored)),
+    )))
+    conn.execute(table.update().where(
+        member([col for col, _ in pks], restored)
+    ).values(dict(
+        (col.key, scalar_subquery(
+            select([target.c[vcol.key]]).where(and_(*[
+                target.c[v.key] == p for p, v in pks
+            ]))
+        ))
+        for col, vcol in versioned if not col.primary_key
+    )))
+    conn.execute(table.insert().from_select(
+        [col.key for col, _ in versioned],
+        select([target.c[vcol.key] for _, vcol in versioned]).where(not_(member(
+            [target.c[vcol.key] for _, vcol in pks],
+            select([col for col, _ in pks]),
+        ))),
+    ))
+    return record_versions(session, model, keys, tx)
+
+
+def revert_to(session, model, transaction_id, criteria=None):
+    """
+    Restore all rows of model changed after ``transaction_id`` to their
+    state at that transaction, using a handful of set-based statements
+    instead of reverting records one at a time. The revert is recorded
+    as a new transaction. Returns the number of reverted rows.
+
+    Args:
+        session (Session): Session to revert rows with.
+        model (type): Versioned model class.
+        transaction_id (int): Transaction id to restore rows to.
+        criteria (list): Criteria against the version class limiting
+            reverted rows to those with matching versions.
+    """
+    check_bind(model)
+    version = version_class(model)
+    vtable = version.__table__
+    tx_column = vtable.c[tx_column_name(model)]
+    keys = select([vtable.c[col.key] for col in inspect(model).primary_key]).where(and_(
+        tx_column > transaction_id, *(criteria or [])
+    )).distinct()
+    if session.connection(mapper=inspect(model)).execute(select([func.count()]).select_from(keys.alias())).scalar() == 0:
+        return 0
+
+    invalidate_all(session)
+    count = revert(session, model, transaction_id, keys, create_transaction(session))
+    session.expire_all()
+    return count
+
+
+def revert_transaction(session, transaction_id, models=None):
+    """
+    Undo changes made by a transaction, restoring every row it touched
+    (across all versioned models) to its state before the transaction.
+    Later changes to those rows are reverted as well. The revert is
+    recorded as a single new transaction. Returns the number of
+    reverted rows per model.
+
+    Args:
+        session (Session): Session to revert rows with.
+        transaction_id (int): Transaction id to undo.
+        models (list): Versioned models to revert rows for. Defaults
+            to all versioned models.
+    """
+    if models is None:
+        models = list(versioning_manager.version_class_map)
+
+    result, tx = {}, None
+    for model in models:
+        check_bind(model)
+        conn = session.connection(mapper=inspect(model))
+        vtable = version_class(model).__table__
+        tx_column = vtable.c[tx_column_name(model)]
+        keys = select([vtable.c[col.key] for col in inspect(model).primary_key]).where(
+            tx_column == transaction_id
+        ).distinct()
+        if conn.execute(select([func.count()]).select_from(keys.alias())).scalar() == 0:
+            continue
+        if tx is None:
+            invalidate_all(session)
+            tx = create_transaction(session)
+        result[model] = revert(session, model, transaction_id - 1, keys, tx)
+    session.expire_all()
+    return result
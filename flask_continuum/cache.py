@@ -0,0 +1,302 @@
+# -*- coding: utf-8 -*-
+#
+# History read cache
+#
+# ------------------------------------------------
+
+
+# imports
+# -------
+import os
+import pickle
+import hashlib
+import tempfile
+import threading
+from collections import OrderedDict
+
+from sqlalchemy import event, func, inspect
+from sqlalchemy.orm import Session
+from sqlalchemy_continuum import version_class
+from sqlalchemy_continuum.utils import tx_column_name
+from sqlalchemy_utils import identity
+
+from .state import component
+
+
+# config
+# ------
+DIRTY = 'continuum.cache.dirty'
+CLEAR = 'continuum.cache.clear'
+
+
+# backends
+# --------
+class MemoryCache(object):
+    """
+    In-process LRU cache backend for materialized histories.
+
+    Arguments:
+        maxsize (int): Maximum number of histories held in memory.
+    """
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self.data = OrderedDict()
+        self.lock = threading.Lock()
+        return
+
+    def get(self, key):
+        with self.lock:
+            value = self.data.get(key)
+            if value is not None:
+                self.data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self.lock:
+            self.data[key] = value
+            self.data.move_to_end(key)
+            while len(self.data) > self.maxsize:
+                self.data.popitem(last=False)
+        return
+
+    def delete(self, key):
+        with self.lock:
+            self.data.pop(key, None)
+        return
+
+    def clear(self):
+        with self.lock:
+            self.data.clear()
+        return
+
+
+class FileSystemCache(object):
+    """
+    Local filesystem cache backend for materialized histories,
+    storing one pickle file per row. Files are written atomically,
+    so the cache can be shared by processes on the same host.
+
+    Arguments:
+        path (str): Directory to store cached histories in.
+    """
+    suffix = '.history'
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        return
+
+    def filename(self, key):
+        return os.path.join(self.path, hashlib.sha1(key.encode('utf-8')).hexdigest() + self.suffix)
+
+    def get(self, key):
+        try:
+            with open(self.filename(key), 'rb') as fi:
+                return pickle.load(fi)
+        except (IOError, EOFError, pickle.UnpicklingError):
+            return
+
+    def set(self, key, value):
+        handle, path = tempfile.mkstemp(dir=self.path)
+        with os.fdopen(handle, 'wb') as fo:
+            pickle.dump(value, fo, pickle.HIGHEST_PROTOCOL)
+        os.replace(path, self.filename(key))
+        return
+
+    def delete(self, key):
+        try:
+            os.remove(self.filename(key))
+        except OSError:
+            pass
+        return
+
+    def clear(self):
+        for name in os.listdir(self.path):
+            if not name.endswith(self.suffix):
+                continue
+            try:
+                os.remove(os.path.join(self.path, name))
+            except OSError:
+                pass
+        return
+
+
+# cache
+# -----
+class HistoryCache(object):
+    """
+    Cache for materialized histories read via :attr:`VersioningMixin.records`,
+    keyed by model and primary key and storing the latest transaction id
+    of each history. Entries are invalidated when a session commits changes
+    to their rows, so repeated reads skip the database entirely:
+
+    .. code-block:: python
+
+        continuum = Continuum(app, db, cache=MemoryCache(maxsize=10000))
+
+    Changes written outside of the ORM (bulk inserts, reverts and retention)
+    clear the whole cache on commit, and deferred writers drop entries for
+    rows once their versions are written. Histories read through a replica
+    are only stored when they reach the latest transaction of their row on
+    the primary, so that lagging reads aren't served after the replica
+    catches up. When other processes write to the
+    database without sharing the cache backend, set ``validate`` to check
+    the latest transaction id of a row (one indexed query) before each hit.
+
+    Arguments:
+        backend (object): Cache backend, such as :class:`MemoryCache`
+            or :class:`FileSystemCache`.
+        validate (bool): Compare cached entries against the latest
+            transaction id of their row before use.
+    """
+
+    def __init__(self, backend, validate=False):
+        self.backend = backend
+        self.validate = validate
+        return
+
+    def key(self, model, ident):
+        return '{}:{}'.format(model.__name__, ':'.join(str(x) for x in ident))
+
+    def latest(self, session, model, ident):
+        """
+        Return latest transaction id in history of row.
+        """
+        version = version_class(model)
+        keys = [col.key for col in inspect(model).primary_key]
+        return session.query(func.max(getattr(version, tx_column_name(model)))).filter(
+            *[getattr(version, key) == value for key, value in zip(keys, ident)]
+        ).scalar()
+
+    def pending(self, session, key):
+        """
+        Return whether session holds changes for cache key that
+        haven't been committed yet.
+        """
+        if session is None:
+            return False
+        return key in session.info.get(DIRTY, ()) or bool(session.info.get(CLEAR))
+
+    def lookup(self, session, model, ident, reader=None):
+        """
+        Return cached entry for row, as a dictionary with the latest
+        transaction id (``tx``) and record data (``records``), or ``None``.
+        Entries are skipped while the session holds uncommitted changes
+        to the row, so that it reads its own writes.
+
+        Args:
+            session (Session): Session reading the history.
+            model (type): Versioned model class.
+            ident (tuple): Primary key of row.
+            reader (Session): Session to validate entries with. Defaults
+                to ``session``.
+        """
+        key = self.key(model, ident)
+        if self.pending(session, key):
+            return
+        entry = self.backend.get(key)
+        if entry is None:
+            return
+        if self.validate and entry['tx'] != self.latest(reader or session, model, ident):
+            return
+        return entry
+
+    def store(self, session, model, ident, records):
+        """
+        Store record data for row, unless the session holds changes
+        to it that haven't been committed yet.
+
+        Args:
+            session (Session): Session records were read with.
+            model (type): Versioned model class.
+            ident (tuple): Primary key of row.
+            records (list): ``(data, changes, transaction_id)`` tuples.
+        """
+        key = self.key(model, ident)
+        if self.pending(session, key):
+            return
+        self.backend.set(key, dict(
+            tx=records[-1][2] if records else None,
+            records=records,
+        ))
+        return
+
+    def invalidate(self, model, idents):
+        """
+        Drop cached histories for rows of model right away, for versions
+        written outside of a session, such as by deferred writers.
+
+        Args:
+            model (type): Versioned model class.
+            idents (list): Primary keys of rows.
+        """
+        for ident in idents:
+            self.backend.delete(self.key(model, ident))
+        return
+
+    def clear(self):
+        """
+        Drop all cached histories.
+        """
+        self.backend.clear()
+        return
+
+
+# events
+# ------
+def flushed(session, flush_context):
+    history_cache = component('cache', session)
+    if history_cache is None:
+        return
+    dirty = session.info.setdefault(DIRTY, set())
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if getattr(obj, '__versioned__', None) is not None:
+            dirty.add(history_cache.key(obj.__class__, identity(obj)))
+    return
+
+
+def committed(session):
+    clear, dirty = session.info.pop(CLEAR, False), session.info.pop(DIRTY, ())
+    if not clear and not dirty:
+        return
+    history_cache = component('cache', session)
+    if history_cache is None:
+        return
+    if clear:
+        history_cache.clear()
+    for key in dirty:
+        history_cache.backend.delete(key)
+    return
+
+
+def rolled_back(session):
+    session.info.pop(CLEAR, None)
+    session.info.pop(DIRTY, None)
+    return
+
+
+EVENTS = (('after_flush', flushed), ('after_commit', committed), ('after_rollback', rolled_back))
+
+
+# helpers
+# -------
+def install():
+    """
+    Invalidate history caches on session commits, for sessions of
+    applications configured with a cache.
+    """
+    for name, listener in EVENTS:
+        if not event.contains(Session, name, listener):
+            event.listen(Session, name, listener)
+    return
+
+
+def invalidate_all(session):
+    """
+    Clear history cache of the session's application when it commits,
+    for changes written outside of the ORM.
+    """
+    if component('cache', session) is not None:
+        session.info[CLEAR] = True
+    return
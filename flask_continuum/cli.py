@@ -0,0 +1,242 @@
+# -*- coding: utf-8 -*-
+#
+# Command-line maintenance tools
+#
+# ------------------------------------------------
+
+
+# imports
+# -------
+import os
+import json
+import click
+from datetime import timedelta
+
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy import func, inspect
+from sqlalchemy.orm import Session
+from sqlalchemy_continuum import version_class, versioning_manager
+from sqlalchemy_continuum.utils import tx_column_name
+
+from .retention import compaction, retention_policy, vacuuming
+from .export import FORMATS, export_history, import_history
+from .partition import partition_period, rotate as rotate_partitions
+
+
+# helpers
+# -------
+def get_session():
+    """
+    Return session for maintenance commands.
+    """
+    continuum = current_app.extensions['continuum']
+    if continuum.db is not None:
+        return continuum.db.session
+    return Session(bind=continuum.engine)
+
+
+def get_models(names):
+    """
+    Resolve versioned models from class or table names, defaulting
+    to all versioned models.
+
+    Args:
+        names (list): Model class or table names.
+    """
+    models = list(versioning_manager.version_class_map)
+    if not names:
+        return sorted(models, key=lambda x: x.__name__)
+
+    lookup = {}
+    for model in models:
+        lookup[model.__name__] = model
+        lookup[model.__table__.name] = model
+    missing = [name for name in names if name not in lookup]
+    if missing:
+        raise click.BadParameter('Unknown versioned models: {}'.format(', '.join(missing)))
+    return [lookup[name] for name in names]
+
+
+class Checkpoint(object):
+    """
+    Progress file recording the last processed parent key per
+    model, allowing interrupted commands to resume.
+
+    Arguments:
+        path (str): Path to checkpoint file. Checkpointing is
+            disabled if ``None``.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.data = {}
+        if path is not None and os.path.exists(path):
+            with open(path, 'r') as fi:
+                self.data = json.load(fi)
+        return
+
+    def get(self, model):
+        key = self.data.get(model.__name__)
+        return tuple(key) if key is not None else None
+
+    def set(self, model, key):
+        if key is None:
+            self.data.pop(model.__name__, None)
+        else:
+            self.data[model.__name__] = list(key)
+        if self.path is not None:
+            with open(self.path, 'w') as fo:
+                json.dump(self.data, fo)
+        return
+
+
+def process(model, chunks, checkpoint):
+    """
+    Consume chunked maintenance operation, echoing progress
+    and recording checkpoints after each chunk.
+    """
+    rows, deleted = 0, 0
+    for chunk in chunks:
+        rows += chunk['rows']
+        deleted += chunk['deleted']
+        checkpoint.set(model, chunk['last'])
+        click.echo('{}: {} rows processed, {} versions removed'.format(
+            model.__name__, rows, deleted))
+    checkpoint.set(model, None)
+    click.echo('{}: done ({} versions removed)'.format(model.__name__, deleted))
+    return
+
+
+# commands
+# --------
+cli = AppGroup('continuum', help='Maintenance commands for versioning history.')
+
+
+@cli.command('stats')
+@click.argument('models', nargs=-1)
+def stats(models):
+    """
+    Show version table statistics for models.
+    """
+    session = get_session()
+    for model in get_models(models):
+        version = version_class(model)
+        keys = [getattr(version, col.key) for col in inspect(model).primary_key]
+        tx = getattr(version, tx_column_name(model))
+        count, first, last = session.query(func.count(), func.min(tx), func.max(tx)).select_from(version).one()
+        rows = session.query(func.count()).select_from(
+            session.query(*keys).distinct().subquery()
+        ).scalar()
+        click.echo('{}: {} versions for {} rows ({:.1f} per row), transactions {} - {}'.format(
+            model.__name__, count, rows, float(count) / rows if rows else 0, first, last))
+    return
+
+
+@cli.command('prune')
+@click.argument('models', nargs=-1)
+@click.option('--keep-last', type=int, default=None, help='Number of recent versions to keep per row.')
+@click.option('--ttl-days', type=float, default=None, help='Remove versions older than this number of days.')
+@click.option('--per-day', is_flag=True, default=False, help='Keep only the latest version per row each day.')
+@click.option('--chunk-size', type=int, default=1000, help='Number of rows processed per transaction.')
+@click.option('--checkpoint', type=click.Path(), default=None, help='File used to record and resume progress.')
+def prune(models, keep_last, ttl_days, per_day, chunk_size, checkpoint):
+    """
+    Remove versions according to retention policies. Policies declared
+    via ``__retention__`` are used unless overridden by options.
+    """
+    session = get_session()
+    checkpoint = Checkpoint(checkpoint)
+
+    policy = {}
+    if keep_last is not None:
+        policy['keep_last'] = keep_last
+    if ttl_days is not None:
+        policy['ttl'] = timedelta(days=ttl_days)
+    if per_day:
+        policy['per_day'] = True
+
+    for model in get_models(models):
+        if partition_period(model) is not None:
+            click.echo('{}: partitioned versions, skipping'.format(model.__name__))
+            continue
+        model_policy = policy or retention_policy(model)
+        if not model_policy:
+            click.echo('{}: no retention policy, skipping'.format(model.__name__))
+            continue
+        process(model, compaction(
+            session, model,
+            policy=model_policy,
+            chunk_size=chunk_size,
+            after=checkpoint.get(model),
+        ), checkpoint)
+    return
+
+
+@cli.command('vacuum')
+@click.argument('models', nargs=-1)
+@click.option('--chunk-size', type=int, default=1000, help='Number of rows processed per transaction.')
+@click.option('--checkpoint', type=click.Path(), default=None, help='File used to record and resume progress.')
+def vacuum(models, chunk_size, checkpoint):
+    """
+    Remove versions without changes compared to their previous version.
+    """
+    session = get_session()
+    checkpoint = Checkpoint(checkpoint)
+    for model in get_models(models):
+        if partition_period(model) is not None:
+            click.echo('{}: partitioned versions, skipping'.format(model.__name__))
+            continue
+        process(model, vacuuming(
+            session, model,
+            chunk_size=chunk_size,
+            after=checkpoint.get(model),
+        ), checkpoint)
+    return
+
+
+@cli.command('rotate')
+@click.argument('models', nargs=-1)
+@click.option('--before', type=click.DateTime(), default=None, help='Only move versions issued before this time.')
+def rotate(models, before):
+    """
+    Move closed versions of partitioned models into period buckets.
+    """
+    session = get_session()
+    for model in get_models(models):
+        if partition_period(model) is None:
+            continue
+        moved = rotate_partitions(session, model, before=before)
+        session.commit()
+        for bucket, count in moved.items():
+            click.echo('{}: moved {} versions to {}'.format(model.__name__, count, bucket))
+    return
+
+
+@cli.command('export')
+@click.argument('models', nargs=-1)
+@click.option('-o', '--output', type=click.Path(), required=True, help='File to write history to. Paths ending with .gz are compressed.')
+@click.option('--format', 'fmt', type=click.Choice(FORMATS), default='jsonl', help='Output format.')
+@click.option('--yield-per', type=int, default=1000, help='Number of rows fetched per round trip.')
+def export(models, output, fmt, yield_per):
+    """
+    Stream version history for models to a file.
+    """
+    count = export_history(get_session(), get_models(models), output, format=fmt, yield_per=yield_per)
+    click.echo('Exported {} versions to {}'.format(count, output))
+    return
+
+
+@cli.command('import')
+@click.argument('source', type=click.Path(exists=True))
+@click.option('--format', 'fmt', type=click.Choice(FORMATS), default='jsonl', help='Input format.')
+@click.option('--model', default=None, help='Model to import rows for (required for CSV).')
+@click.option('--batch-size', type=int, default=1000, help='Number of versions written per transaction.')
+def import_(source, fmt, model, batch_size):
+    """
+    Restore version history from an exported file.
+    """
+    model = get_models([model])[0] if model is not None else None
+    count = import_history(get_session(), source, format=fmt, model=model, batch_size=batch_size)
+    click.echo('Imported {} versions from {}'.format(count, source))
+    return
@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+#
+# Coalescing rapid successive updates
+#
+# ------------------------------------------------
+
+
+# imports
+# -------
+from datetime import datetime, timedelta
+
+from sqlalchemy import inspect
+from sqlalchemy_continuum import Operation, version_class
+from sqlalchemy_continuum.utils import tx_column_name
+from sqlalchemy_utils import identity
+
+from .pause import PausableUnitOfWork
+
+
+# helpers
+# -------
+def coalesce_window(model):
+    """
+    Return coalescing window declared for model via ``__coalesce__``,
+    as a ``timedelta``. Updates to a row by the same user within the
+    window amend its latest version instead of creating a new one:
+
+    .. code-block:: python
+
+        class Article(db.Model, VersioningMixin):
+            __versioned__ = {}
+            __coalesce__ = 30  # seconds, or timedelta(seconds=30)
+
+    Args:
+        model (type): Versioned model class.
+    """
+    window = getattr(model, '__coalesce__', None)
+    if window is None or isinstance(window, timedelta):
+        return window
+    return timedelta(seconds=window)
+
+
+# unit of work
+# ------------
+class CoalescingUnitOfWork(PausableUnitOfWork):
+    """
+    SQLAlchemy-Continuum unit of work amending the latest version of
+    a row, rather than creating a new one, for updates to models
+    declaring a ``__coalesce__`` window. Versions are only amended when
+    the latest version was written by the same user within the window,
+    and doesn't record a deletion. Transaction rows created for flushes
+    whose changes were all coalesced are removed again, so amending
+    versions doesn't leave empty transactions behind.
+    """
+
+    def reset(self, session=None):
+        self.coalesced = False
+        return super(CoalescingUnitOfWork, self).reset(session)
+
+    def coalesced_version(self, target, window):
+        """
+        Return latest version object for target if it can be amended
+        by the current transaction, or ``None``.
+        """
+        version = version_class(target.__class__)
+        transaction_cls = self.manager.transaction_cls
+        tx_column = getattr(version, tx_column_name(target))
+        keys = [col.key for col in inspect(target.__class__).primary_key]
+
+        latest = self.version_session.query(version, transaction_cls).join(
+            transaction_cls, transaction_cls.id == tx_column
+        ).filter(
+            *[getattr(version, key) == value for key, value in zip(keys, identity(target))]
+        ).order_by(tx_column.desc()).first()
+        if latest is None:
+            return
+
+        version_obj, transaction = latest
+        current = self.current_transaction
+        if version_obj.operation_type == Operation.DELETE or transaction.issued_at is None:
+            return
+        if transaction.issued_at < (current.issued_at or datetime.utcnow()) - window:
+            return
+        if getattr(transaction, 'user_id', None) != getattr(current, 'user_id', None):
+            return
+        return version_obj
+
+    def process_operation(self, operation):
+        target = operation.target
+        window = coalesce_window(target.__class__)
+        if window is None or operation.type != Operation.UPDATE:
+            return super(CoalescingUnitOfWork, self).process_operation(operation)
+
+        key = (version_class(target.__class__), identity(target) + (self.current_transaction.id,))
+        version_obj = None if key in self.version_objs else self.coalesced_version(target, window)
+        if version_obj is None:
+            return super(CoalescingUnitOfWork, self).process_operation(operation)
+
+        # amend latest version in place, keeping its operation type
+        self.assign_attributes(target, version_obj)
+        self.manager.plugins.after_create_version_object(self, target, version_obj)
+        operation.processed = True
+        self.coalesced = True
+        return
+
+    def process_after_flush(self, session):
+        super(CoalescingUnitOfWork, self).process_after_flush(session)
+        if session is not self.version_session:
+            self.discard_transaction(session)
+        return
+
+    def discard_transaction(self, session):
+        """
+        Delete current transaction row if no version references it
+        because every change flushed with it was coalesced. A new
+        transaction is created by the next flush with changes.
+        """
+        transaction = self.current_transaction
+        if transaction is None or not self.coalesced or self.version_objs or self.pending_statements:
+            return
+        table = self.manager.transaction_cls.__table__
+        self.version_session.execute(table.delete().where(table.c.id == transaction.id))
+        if transaction in session:
+            session.expunge(transaction)
+        self.current_transaction = None
+        self.coalesced = False
+        return
@@ -0,0 +1,328 @@
+# -*- coding: utf-8 -*-
+#
+# Streaming history export and import
+#
+# ------------------------------------------------
+
+
+# imports
+# -------
+import io
+import csv
+import gzip
+import json
+import decimal
+from datetime import date, datetime
+
+from sqlalchemy import Sequence, func, inspect, select
+from sqlalchemy_continuum import version_class, versioning_manager
+from sqlalchemy_continuum.utils import tx_column_name
+
+from .cache import invalidate_all
+from .partition import partitioned
+from .replica import read_session
+
+
+# config
+# ------
+FORMATS = ['jsonl', 'csv']
+MODEL = '__model__'
+PREFIX = 'transaction.'
+NULL = '\\N'
+DATETIME_FORMATS = ['%Y-%m-%dT%H:%M:%S.%f', '%Y-%m-%dT%H:%M:%S']
+
+
+# helpers
+# -------
+def open_stream(target, mode, compress=None):
+    """
+    Open path or file object for streaming text, using gzip
+    compression for ``.gz`` paths or when ``compress`` is set.
+    Returns the stream and whether it should be closed by caller.
+    """
+    if not isinstance(target, str):
+        if compress:
+            return io.TextIOWrapper(gzip.GzipFile(fileobj=target, mode=mode[0] + 'b'), newline=''), True
+        return target, False
+
+    if compress is None:
+        compress = target.endswith('.gz')
+    if compress:
+        return gzip.open(target, mode[0] + 't', newline=''), True
+    return open(target, mode[0], newline=''), True
+
+
+def encode(value):
+    """
+    Encode column value for serialization.
+    """
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, decimal.Decimal):
+        return str(value)
+    return value
+
+
+def decode(column, value):
+    """
+    Decode serialized value for column.
+    """
+    if value is None or (isinstance(value, str) and value == '' and not is_string(column)):
+        return None
+    try:
+        kind = column.type.python_type
+    except NotImplementedError:
+        return value
+    if isinstance(value, kind):
+        return value
+    if kind is datetime:
+        for fmt in DATETIME_FORMATS:
+            try:
+                return datetime.strptime(value, fmt)
+            except ValueError:
+                continue
+        raise ValueError('Could not parse datetime value {!r}'.format(value))
+    if kind is date:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    if kind is bool:
+        return value in (True, 1, '1', 'True', 'true')
+    if kind in (int, float, decimal.Decimal):
+        return kind(value)
+    return value
+
+
+def is_string(column):
+    try:
+        return column.type.python_type is str
+    except NotImplementedError:
+        return False
+
+
+def reset_sequence(conn):
+    """
+    Move the transaction id sequence past imported transaction ids,
+    on PostgreSQL. Other databases derive ids from existing rows.
+    """
+    if conn.dialect.name != 'postgresql':
+        return
+    column = versioning_manager.transaction_cls.__table__.c.id
+    sequence = column.default
+    if isinstance(sequence, Sequence):
+        name = sequence.name if sequence.schema is None else '{}.{}'.format(sequence.schema, sequence.name)
+    else:
+        name = conn.execute(select([
+            func.pg_get_serial_sequence(column.table.fullname, column.name)
+        ])).scalar()
+    if name is None:
+        return
+    latest = conn.execute(select([func.max(column)])).scalar()
+    if latest is not None:
+        conn.execute(select([func.setval(name, latest)]))
+    return
+
+
+def versioned_models():
+    """
+    Return versioned models keyed by class name.
+    """
+    return dict(
+        (model.__name__, model)
+        for model in versioning_manager.version_class_map
+    )
+
+
+# export
+# ------
+def iter_history(session, model, yield_per=1000):
+    """
+    Stream version rows for model joined with their transaction
+    metadata, using a server-side cursor where supported and fetching
+    ``yield_per`` rows at a time. Rows are yielded as dictionaries with
+    transaction columns prefixed by ``transaction.``.
+
+    Args:
+        session (Session): Session to query with.
+        model (type): Versioned model class.
+        yield_per (int): Number of rows fetched per round trip.
+    """
+    reader = read_session(session)
+    table = version_class(model).__table__
+    source = partitioned(reader, model)
+    if source is not None:
+        table = source
+    transaction = versioning_manager.transaction_cls.__table__
+    tx_column = table.c[tx_column_name(model)]
+
+    columns = list(table.c) + [
+        col.label(PREFIX + col.name) for col in transaction.c
+    ]
+    query = select(columns).select_from(
+        table.outerjoin(transaction, transaction.c.id == tx_column)
+    ).order_by(tx_column)
+
+    conn = reader.connection(mapper=inspect(version_class(model)))
+    conn = conn.execution_options(stream_results=True)
+    result = conn.execute(query)
+    keys = [col.name for col in table.c] + [PREFIX + col.name for col in transaction.c]
+    try:
+        while True:
+            rows = result.fetchmany(yield_per)
+            if not rows:
+                break
+            for row in rows:
+                yield dict(zip(keys, map(encode, row)))
+    finally:
+        result.close()
+    return
+
+
+def export_history(session, models, target, format='jsonl', compress=None, yield_per=1000):
+    """
+    Write full history for models to newline-delimited JSON or CSV,
+    in constant memory. Paths ending with ``.gz`` are gzip-compressed:
+
+    .. code-block:: python
+
+        >>> export_history(db.session, [Article], 'articles.jsonl.gz')
+        1024
+
+    JSON lines carry the model name in a ``__model__`` key, so multiple
+    models can share a file. CSV exports are limited to a single model,
+    and write ``NULL`` values as ``\\N`` to keep them apart from empty
+    strings. Returns the number of exported versions.
+
+    Args:
+        session (Session): Session to query with.
+        models (list): Versioned model classes to export.
+        target (str, file): Path or file object to write to.
+        format (str): Output format, either ``jsonl`` or ``csv``.
+        compress (bool): Force gzip compression on or off.
+        yield_per (int): Number of rows fetched per round trip.
+    """
+    if format not in FORMATS:
+        raise AssertionError('Unsupported export format {}. Use one of: {}'.format(format, ', '.join(FORMATS)))
+    if format == 'csv' and len(models) != 1:
+        raise AssertionError('CSV exports support a single model.')
+
+    stream, close = open_stream(target, 'w', compress=compress)
+    count = 0
+    try:
+        for model in models:
+            writer = None
+            for row in iter_history(session, model, yield_per=yield_per):
+                if format == 'jsonl':
+                    row[MODEL] = model.__name__
+                    stream.write(json.dumps(row) + '\n')
+                else:
+                    if writer is None:
+                        writer = csv.DictWriter(stream, fieldnames=list(row.keys()))
+                        writer.writeheader()
+                    writer.writerow(dict(
+                        (key, NULL if value is None else value)
+                        for key, value in row.items()
+                    ))
+                count += 1
+    finally:
+        if close:
+            stream.close()
+    return count
+
+
+# import
+# ------
+def iter_rows(source, format='jsonl', model=None):
+    """
+    Iterate over ``(model, row)`` pairs in export file.
+    """
+    models = versioned_models()
+    if format == 'csv':
+        if model is None:
+            raise AssertionError('CSV imports require a target model.')
+        for row in csv.DictReader(source):
+            yield model, dict(
+                (key, None if value == NULL else value)
+                for key, value in row.items()
+            )
+    else:
+        for line in source:
+            if not line.strip():
+                continue
+            row = json.loads(line)
+            yield model or models[row.pop(MODEL)], row
+    return
+
+
+def import_history(session, source, format='jsonl', model=None, compress=None, batch_size=1000):
+    """
+    Restore history written by :func:`export_history` into empty
+    version tables, streaming the file and committing every
+    ``batch_size`` versions. Transaction rows are created once per
+    exported transaction, keeping their ids, and the transaction id
+    sequence is moved past them on PostgreSQL. Returns the number of
+    imported versions.
+
+    Args:
+        session (Session): Session to write with.
+        source (str, file): Path or file object to read from.
+        format (str): Input format, either ``jsonl`` or ``csv``.
+        model (type): Model to import rows for. Required for CSV files.
+        compress (bool): Force gzip decompression on or off.
+        batch_size (int): Number of versions written per transaction.
+    """
+    if format not in FORMATS:
+        raise AssertionError('Unsupported import format {}. Use one of: {}'.format(format, ', '.join(FORMATS)))
+    transaction = versioning_manager.transaction_cls.__table__
+
+    def flush(batch):
+        conn = session.connection(mapper=inspect(versioning_manager.transaction_cls))
+
+        # create missing transactions
+        transactions = {}
+        for _, _, tx in batch:
+            transactions[tx['id']] = tx
+        existing = set(row[0] for row in conn.execute(
+            select([transaction.c.id]).where(transaction.c.id.in_(list(transactions)))
+        ))
+        missing = [tx for key, tx in transactions.items() if key not in existing]
+        if missing:
+            conn.execute(transaction.insert(), missing)
+
+        # insert versions per table
+        tables = {}
+        for table, values, _ in batch:
+            tables.setdefault(table, []).append(values)
+        for table, rows in tables.items():
+            conn.execute(table.insert(), rows)
+        invalidate_all(session)
+        session.commit()
+        return
+
+    stream, close = open_stream(source, 'r', compress=compress)
+    count, batch = 0, []
+    try:
+        for model, row in iter_rows(stream, format=format, model=model):
+            table = version_class(model).__table__
+            values = dict(
+                (col.name, decode(col, row.get(col.name)))
+                for col in table.c if col.name in row
+            )
+            tx = dict(
+                (col.name, decode(col, row.get(PREFIX + col.name)))
+                for col in transaction.c if PREFIX + col.name in row
+            )
+            tx['id'] = values[tx_column_name(model)]
+            batch.append((table, values, tx))
+            if len(batch) >= batch_size:
+                flush(batch)
+                count += len(batch)
+                batch = []
+        if batch:
+            flush(batch)
+            count += len(batch)
+        if count:
+            reset_sequence(session.connection(mapper=inspect(versioning_manager.transaction_cls)))
+            session.commit()
+    finally:
+        if close:
+            stream.close()
+    return count
@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+#
+# Current user resolution
+#
+# ------------------------------------------------
+
+
+# imports
+# -------
+from flask import g, request
+from flask.globals import _app_ctx_stack, _request_ctx_stack
+
+try:
+    from flask_login import current_user as login_user
+except ImportError:  # pragma: no cover
+    login_user = None
+
+try:
+    from flask_jwt_extended import get_jwt_identity
+except ImportError:  # pragma: no cover
+    get_jwt_identity = None
+
+
+# config
+# ------
+CACHE = '_continuum_users'
+
+
+# resolvers
+# ---------
+def login_user_id():
+    """
+    Return id of ``flask_login.current_user`` within a request, or ``None``
+    if Flask-Login isn't installed or no user is logged in.
+    """
+    if login_user is None or _request_ctx_stack.top is None:
+        return
+    try:
+        return login_user.id
+    except AttributeError:
+        return
+
+
+def jwt_user_id():
+    """
+    Return identity of verified JWT within a request, or ``None``
+    if Flask-JWT-Extended isn't installed or no token was verified.
+    """
+    if get_jwt_identity is None or _request_ctx_stack.top is None:
+        return
+    try:
+        return get_jwt_identity()
+    except RuntimeError:
+        return
+
+
+def header_user_id(name='X-User-Id'):
+    """
+    Return resolver reading user id from a request header, for
+    applications behind an authenticating proxy.
+
+    Args:
+        name (str): Name of header carrying user id.
+    """
+    def resolve():
+        if _request_ctx_stack.top is None:
+            return
+        return request.headers.get(name)
+    return resolve
+
+
+def g_user_id(attr='user_id'):
+    """
+    Return resolver reading user id from attribute on ``flask.g``,
+    for applications that authenticate requests themselves.
+
+    Args:
+        attr (str): Name of attribute on ``flask.g`` holding user id.
+    """
+    def resolve():
+        if _app_ctx_stack.top is None:
+            return
+        return g.get(attr)
+    return resolve
+
+
+# chain
+# -----
+class UserResolver(object):
+    """
+    Callable resolving the user id recorded on transaction rows, trying
+    each resolver in turn until one returns a value. The resolved id is
+    cached on the current request (or application) context, so user
+    loaders run at most once per request regardless of how many
+    transactions are committed:
+
+    .. code-block:: python
+
+        resolver = UserResolver(g_user_id('user'), header_user_id('X-User'), login_user_id)
+        continuum = Continuum(app, db, current_user=resolver)
+
+    Outside of an application context, ``None`` is returned.
+
+    Arguments:
+        resolvers (callable): Functions returning a user id or ``None``.
+    """
+
+    def __init__(self, *resolvers):
+        self.resolvers = list(resolvers)
+        return
+
+    def context(self):
+        """
+        Return context object the resolved id is cached on.
+        """
+        return _request_ctx_stack.top or _app_ctx_stack.top
+
+    def resolve(self):
+        """
+        Return user id from the first resolver yielding a value,
+        bypassing the cache.
+        """
+        for resolver in self.resolvers:
+            value = resolver()
+            if value is not None:
+                return value
+        return
+
+    def reset(self):
+        """
+        Drop cached user id for the current context, for example after
+        logging a user in or out during a request.
+        """
+        ctx = self.context()
+        if ctx is not None:
+            getattr(ctx, CACHE, {}).pop(self, None)
+        return
+
+    def __call__(self):
+        ctx = self.context()
+        if ctx is None:
+            return
+        cache = getattr(ctx, CACHE, None)
+        if cache is None:
+            cache = {}
+            setattr(ctx, CACHE, cache)
+        if self not in cache:
+            cache[self] = self.resolve()
+        return cache[self]
@@ -0,0 +1,229 @@
+# -*- coding: utf-8 -*-
+#
+# Versioning overhead metrics
+#
+# ------------------------------------------------
+
+
+# imports
+# -------
+import time
+import threading
+from functools import wraps
+from collections import Counter
+
+from flask.signals import Namespace
+from sqlalchemy import event, inspect
+from sqlalchemy_continuum.plugins.base import Plugin
+
+from .state import component
+
+
+# signals
+# -------
+signals = Namespace()
+versions_flushed = signals.signal('continuum-versions-flushed')
+history_read = signals.signal('continuum-history-read')
+
+
+# stats
+# -----
+class Stats(object):
+    """
+    Process-wide counters for versioning overhead, available as
+    ``continuum.stats`` (or ``app.extensions['continuum'].stats``) when
+    the extension is created with ``metrics=True``:
+
+    .. code-block:: python
+
+        >>> continuum.stats.as_dict()
+        {'flushes': 12, 'versions': {'Article': 40}, 'version_time': 0.012,
+         'transactions': 12, 'transaction_time': 0.004,
+         'reads': {'records': {'count': 3, 'queries': 3, 'time': 0.002}}}
+
+    Each flush creating versions also sends the ``versions_flushed``
+    signal with ``versions`` (counts per model), ``version_time`` and
+    ``transaction_time`` keyword arguments. Each history read sends
+    ``history_read`` with ``name``, ``queries`` and ``time``.
+
+    Arguments:
+        app (Flask): Application used as sender for signals.
+    """
+
+    def __init__(self, app=None):
+        self.app = app
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.reset()
+        return
+
+    def reset(self):
+        """
+        Reset all counters.
+        """
+        with self.lock:
+            self.flushes = 0
+            self.versions = Counter()
+            self.version_time = 0.0
+            self.transactions = 0
+            self.transaction_time = 0.0
+            self.reads = {}
+        return
+
+    def as_dict(self):
+        """
+        Return copy of counters as a dictionary.
+        """
+        with self.lock:
+            return dict(
+                flushes=self.flushes,
+                versions=dict(self.versions),
+                version_time=self.version_time,
+                transactions=self.transactions,
+                transaction_time=self.transaction_time,
+                reads=dict((key, dict(value)) for key, value in self.reads.items()),
+            )
+
+    def record_transaction(self, elapsed):
+        with self.lock:
+            self.transactions += 1
+            self.transaction_time += elapsed
+        return
+
+    def record_flush(self, versions, elapsed, transaction_time=None):
+        with self.lock:
+            self.flushes += 1
+            self.versions.update(versions)
+            self.version_time += elapsed
+        versions_flushed.send(
+            self.app, versions=dict(versions),
+            version_time=elapsed, transaction_time=transaction_time,
+        )
+        return
+
+    def read(self, name, func, *args, **kwargs):
+        """
+        Call history read function, recording its latency and the
+        number of statements it issued. Nested reads are attributed
+        to the outermost one.
+        """
+        local = self.local
+        if getattr(local, 'depth', 0):
+            return func(*args, **kwargs)
+
+        local.depth, local.queries = 1, 0
+        start = time.time()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            elapsed, queries = time.time() - start, local.queries
+            local.depth = 0
+            with self.lock:
+                data = self.reads.setdefault(name, dict(count=0, queries=0, time=0.0))
+                data['count'] += 1
+                data['queries'] += queries
+                data['time'] += elapsed
+            history_read.send(self.app, name=name, queries=queries, time=elapsed)
+
+    def count(self, conn, cursor, statement, parameters, context, executemany):
+        """
+        Engine listener counting statements issued during reads.
+        """
+        if getattr(self.local, 'depth', 0):
+            self.local.queries += 1
+        return
+
+
+def install(stats, engine):
+    """
+    Count statements issued on engine during history reads.
+    """
+    event.listen(engine, 'before_cursor_execute', stats.count)
+    return
+
+
+def uninstall(stats, engine):
+    """
+    Stop counting statements on engine, after :func:`install`.
+    """
+    if event.contains(engine, 'before_cursor_execute', stats.count):
+        event.remove(engine, 'before_cursor_execute', stats.count)
+    return
+
+
+def measured(name):
+    """
+    Decorator recording latency and query counts for history reads
+    of model instances, when metrics are enabled for the application
+    of their session. Otherwise, the wrapped function is called directly.
+
+    Args:
+        name (str): Name reads are recorded under.
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(self, *args, **kwargs):
+            state = inspect(self, raiseerr=False)
+            stats = component('stats', state.session if state is not None else None)
+            if stats is None:
+                return func(self, *args, **kwargs)
+            return stats.read(name, func, self, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+# plugin
+# ------
+class MetricsPlugin(Plugin):
+    """
+    SQLAlchemy-Continuum plugin timing transaction row inserts and
+    version object generation, and counting versions per model, for
+    every flush. Counters are recorded on the :class:`Stats` of the
+    application flushing, and hooks return immediately when metrics
+    are disabled for it.
+    """
+
+    def transaction_args(self, uow, session):
+        stats = component('stats', session)
+        if stats is None:
+            uow.metrics = None
+            return {}
+        uow.metrics = dict(stats=stats, start=time.time(), transaction_time=None, versions=Counter())
+        return {}
+
+    def before_flush(self, uow, session):
+        data = getattr(uow, 'metrics', None)
+        if data is not None and data['start'] is not None:
+            data['transaction_time'] = time.time() - data['start']
+            data['start'] = None
+            data['stats'].record_transaction(data['transaction_time'])
+        return
+
+    def before_create_version_objects(self, uow, session):
+        if getattr(uow, 'metrics', None) is None:
+            stats = component('stats', session)
+            if stats is None:
+                return
+            uow.metrics = dict(stats=stats, start=None, transaction_time=None, versions=Counter())
+        uow.metrics['created'] = time.time()
+        return
+
+    def after_create_version_object(self, uow, parent_obj, version_obj):
+        data = getattr(uow, 'metrics', None)
+        if data is not None:
+            data['versions'][parent_obj.__class__.__name__] += 1
+        return
+
+    def after_create_version_objects(self, uow, session):
+        data = getattr(uow, 'metrics', None)
+        if data is not None and data.get('created') is not None:
+            start, versions = data['created'], data['versions']
+            data['created'] = None
+            if not versions:
+                return
+            data['stats'].record_flush(
+                versions, time.time() - start,
+                transaction_time=data['transaction_time'],
+            )
+            data['versions'] = Counter()
+        return
@@ -7,8 +7,616 @@
 
 # imports
 # -------
-from sqlalchemy import inspect
-from sqlalchemy_continuum import changeset, count_versions, is_modified
+from itertools import chain
+from collections import OrderedDict
+from sqlalchemy import and_, event, func, inspect, or_
+from sqlalchemy.orm import Session, aliased, object_session
+from sqlalchemy.orm.attributes import QueryableAttribute
+from sqlalchemy_continuum import Operation, changeset, version_class, versioning_manager
+from sqlalchemy_continuum.utils import end_tx_column_name, option, tx_column_name, versioned_column_properties
+from sqlalchemy_utils import identity
+
+from .metrics import measured
+from .partition import adjacent, partition_period, partition_query
+from .replica import read_session, write_session
+from .sparse import CHANGED, is_sparse, reconstruct
+from .state import component
+
+
+# helpers
+# -------
+class VersionedInstanceMixin(object):
+    """
+    Base class for read-only record proxies returned by
+    :attr:`VersioningMixin.records`. Records hold column values in
+    ``__slots__`` rather than subclassing the mapped model, so they skip
+    SQLAlchemy instrumentation and can't be added to a session. Methods
+    and properties defined on the model are evaluated against record
+    values, and history navigation is delegated to the underlying
+    version object.
+
+    Arguments:
+        data (dict): Column values for record.
+        version (object): Version object record was built from.
+        changes (dict): Changes introduced by version, if known.
+        transaction_id (int): Transaction id of version, if known.
+        lookup (callable): Callable loading the version object on first
+            access, for records restored from the history cache.
+    """
+    __slots__ = ('_version', '_lookup', '_tx', '__changes__')
+    __columns__ = ()
+    __model__ = None
+
+    def __init__(self, data, version=None, changes=None, transaction_id=None, lookup=None):
+        init = object.__setattr__
+        for key in self.__columns__:
+            init(self, key, data.get(key))
+        init(self, '_version', version)
+        init(self, '_lookup', lookup)
+        init(self, '_tx', transaction_id)
+        init(self, '__changes__', changes)
+        return
+
+    def __setattr__(self, name, value):
+        raise AttributeError('{} records are read-only'.format(self.__model__.__name__))
+
+    def __getattr__(self, name):
+        # errors raised by record properties propagate unchanged
+        if name in VersionedInstanceMixin.__dict__:
+            return VersionedInstanceMixin.__dict__[name].__get__(self, type(self))
+        if name.startswith('__') or name.startswith('_sa_'):
+            raise AttributeError(name)
+        for klass in self.__model__.__mro__:
+            if name in klass.__dict__:
+                attr = klass.__dict__[name]
+                break
+        else:
+            raise AttributeError('{!r} object has no attribute {!r}'.format(type(self).__name__, name))
+
+        # column and relationship attributes aren't carried by records
+        if isinstance(attr, QueryableAttribute):
+            raise AttributeError('{!r} attribute {!r} is not versioned'.format(type(self).__name__, name))
+        if hasattr(attr, '__get__'):
+            return attr.__get__(self, type(self))
+        return attr
+
+    def __repr__(self):
+        return '<{}({})>'.format(type(self).__name__, ', '.join(
+            '{}={!r}'.format(key, getattr(self, key)) for key in self.__columns__
+        ))
+
+    @property
+    def __version__(self):
+        """
+        Version object for record. Records restored from the history
+        cache load it on first access, and records read through a
+        replica reload it once the replica session has been closed.
+        """
+        version = self._version
+        if self._lookup is not None and (version is None or object_session(version) is None):
+            version = self._lookup()
+            object.__setattr__(self, '_version', version)
+        return version
+
+    @property
+    def previous(self):
+        if partition_period(self.__model__) is not None:
+            return adjacent(object_session(self.__version__), self.__model__, self.__version__, reverse=True)
+        return self.__version__.previous
+
+    @property
+    def next(self):
+        if partition_period(self.__model__) is not None:
+            return adjacent(object_session(self.__version__), self.__model__, self.__version__)
+        return self.__version__.next
+
+    @property
+    def index(self):
+        if partition_period(self.__model__) is not None:
+            version = version_class(self.__model__)
+            tx_column = getattr(version, tx_column_name(self.__model__))
+            return partition_query(object_session(self.__version__), self.__model__, before=self.transaction_id).filter(
+                tx_column < self.transaction_id,
+                *[getattr(version, key) == getattr(self, key) for key in (
+                    col.key for col in inspect(self.__model__).primary_key
+                )]
+            ).order_by(None).count()
+        return self.__version__.index
+
+    @property
+    def transaction_id(self):
+        if self._tx is not None:
+            return self._tx
+        return getattr(self.__version__, tx_column_name(self.__version__))
+
+    @property
+    def changeset(self):
+        """
+        Return changes introduced by this version, as a dictionary
+        of ``[old, new]`` values keyed by column.
+        """
+        if self.__changes__ is not None:
+            return self.__changes__
+        return self.__version__.changeset
+
+    def revert(self):
+        version = self.__version__
+        model = self.__model__
+
+        # versions read from a replica revert on the primary session
+        session = write_session(version)
+        if session is not object_session(version):
+            version = session.merge(version, load=False)
+
+        if not is_sparse(model):
+            version.revert()
+            return
+
+        # sparse versions revert from reconstructed record data
+        parent = version.version_parent
+        if version.operation_type == Operation.DELETE:
+            if parent is not None:
+                session.delete(parent)
+            return
+        if parent is None:
+            parent = model()
+        for prop in versioned_column_properties(model):
+            setattr(parent, prop.key, getattr(self, prop.key))
+        session.add(parent)
+        return
+
+
+RECORDS = {}
+
+
+def record_class(model):
+    """
+    Return record proxy class for versioned model, building
+    it (and the list of columns it carries) on first use. Record
+    classes are cached per model in ``RECORDS``.
+
+    Args:
+        model (type): Versioned model class.
+    """
+    if model not in RECORDS:
+        columns = []
+        mapper = inspect(model)
+        for col in mapper.attrs:
+            if hasattr(col, 'columns'):
+                columns.append(col.columns[0].key)
+
+        RECORDS[model] = type(
+            '{}Record'.format(model.__name__),
+            (VersionedInstanceMixin,),
+            {
+                '__slots__': tuple(columns),
+                '__columns__': tuple(columns),
+                '__model__': model,
+                '__module__': model.__module__,
+            }
+        )
+    return RECORDS[model]
+
+
+def make_records(model, versions, instance=None):
+    """
+    Wrap version objects in cached record proxies for model. Columns
+    not stored in the version table are taken from ``instance`` when
+    it is available. For sparse models, ``versions`` must be the ordered
+    history of a single row, starting at its first version.
+
+    Args:
+        model (type): Versioned model class.
+        versions (list): Version objects to wrap.
+        instance (object): Current instance the versions belong to.
+    """
+    VersionedClass = record_class(model)
+    columns = VersionedClass.__columns__
+    versions = list(versions)
+    states = reconstruct(versions, columns) if is_sparse(model) else None
+
+    # replica sessions are closed with the primary transaction
+    primary = write_session(versions[0]) if versions else None
+    if primary is not None and primary is object_session(versions[0]):
+        primary = None
+
+    proxies = []
+    for record in versions:
+        state, changes = next(states) if states is not None else (record.__dict__, None)
+
+        # get column data
+        data = {}
+        for k in columns:
+            if k in state:
+                data[k] = state[k] if states is not None else getattr(record, k)
+            elif instance is not None:
+                data[k] = getattr(instance, k)
+
+        lookup = version_loader(model, primary, identity(record)) if primary is not None else None
+        proxies.append(VersionedClass(data, version=record, changes=changes, lookup=lookup))
+
+    return proxies
+
+
+def version_loader(model, session, ident):
+    """
+    Return callable loading version object for model by primary key,
+    through the history read session of ``session`` at call time.
+
+    Args:
+        model (type): Versioned model class.
+        session (Session): Primary session.
+        ident (tuple): Primary key of version object.
+    """
+    version = version_class(model)
+
+    def load():
+        reader = read_session(session)
+        if partition_period(model) is None:
+            return reader.query(version).get(ident)
+        values = dict(zip([col.key for col in inspect(version).primary_key], ident))
+        return partition_query(reader, model, at=values[tx_column_name(model)]).filter(
+            *[getattr(version, key) == value for key, value in values.items()]
+        ).one()
+    return load
+
+
+def cached_records(instance, history_cache):
+    """
+    Return records for instance from history cache, materializing
+    and storing them on a miss. Version objects for cached records are
+    loaded lazily, when history navigation is used.
+
+    Args:
+        instance (VersioningMixin): Versioned model instance.
+        history_cache (HistoryCache): Active history cache.
+    """
+    model = instance.__class__
+    session = object_session(instance)
+    reader = read_session(session)
+    ident = identity(instance)
+    entry = history_cache.lookup(session, model, ident, reader=reader)
+    if entry is None:
+        records = History(instance)[:]
+
+        # replicas may lag behind invalidations on the primary
+        latest = records[-1].transaction_id if records else None
+        if reader is session or latest == history_cache.latest(session, model, ident):
+            history_cache.store(session, model, ident, [
+                (dict((k, getattr(item, k)) for k in item.__columns__), item.__changes__, item.transaction_id)
+                for item in records
+            ])
+        return records
+
+    version = version_class(model)
+    keys = [col.key for col in inspect(version).primary_key]
+    tx_name = tx_column_name(model)
+    VersionedClass = record_class(model)
+
+    def lookup(values):
+        return version_loader(model, session, tuple(values[key] for key in keys))
+
+    proxies = []
+    for data, changes, tx in entry['records']:
+        proxies.append(VersionedClass(
+            data, changes=changes, transaction_id=tx,
+            lookup=lookup(dict(data, **{tx_name: tx})),
+        ))
+    return proxies
+
+
+def scalar_subquery(query):
+    """
+    Return scalar subquery for query across SQLAlchemy versions.
+    """
+    try:
+        return query.scalar_subquery()
+    except AttributeError:  # SQLAlchemy < 1.4
+        return query.as_scalar()
+
+
+def versions_at(session, model, transaction_id):
+    """
+    Return query over version table selecting the single version
+    of each row valid at a given transaction, using the validity
+    strategy's ``end_transaction_id`` column where available. Versions
+    recording deletions are included. Sparse models aren't supported,
+    since their version rows don't carry unchanged columns.
+
+    Args:
+        session (Session): Session to query with.
+        model (type): Versioned model class.
+        transaction_id (int): Transaction id to select versions at.
+    """
+    if is_sparse(model):
+        raise AssertionError(
+            'Point-in-time queries are not supported for sparse model {}. '
+            'Read records or history instead.'.format(model.__name__))
+
+    version = version_class(model)
+    tx_column = getattr(version, tx_column_name(model))
+    at = transaction_id if isinstance(transaction_id, int) else None
+    query = partition_query(session, model, at=at).filter(tx_column <= transaction_id)
+    if option(model, 'strategy') == 'validity':
+        end_column = getattr(version, end_tx_column_name(model))
+        query = query.filter(or_(end_column.is_(None), end_column > transaction_id))
+    else:
+        alias = aliased(version)
+        keys = [col.key for col in inspect(model).primary_key]
+        latest = scalar_subquery(
+            session.query(func.max(getattr(alias, tx_column_name(model))))
+            .filter(
+                getattr(alias, tx_column_name(model)) <= transaction_id,
+                *[getattr(alias, key) == getattr(version, key) for key in keys]
+            ).correlate(version)
+        )
+        query = query.filter(tx_column == latest)
+    return query
+
+
+def configure_records():
+    """
+    Build record proxy classes for all configured models
+    using the ``VersioningMixin``.
+    """
+    for model in list(versioning_manager.version_class_map):
+        if issubclass(model, VersioningMixin):
+            record_class(model)
+    return
+
+
+class History(object):
+    """
+    Lazy, sliceable view over the versioning history of a model
+    instance. Only the requested window of versions is queried and
+    held in memory, with ordering, ``LIMIT`` and ``OFFSET`` pushed
+    down to the database:
+
+    .. code-block:: python
+
+        >>> len(article.history)        # COUNT query
+        >>> article.history[-10:]       # latest 10 records
+        >>> article.history[0]          # first record
+        >>> reversed(article.history)   # newest to oldest, in pages
+
+    Keyset pagination over transaction ids is also available:
+
+    .. code-block:: python
+
+        >>> page = article.history.page(limit=20)
+        >>> page = article.history.page(after=page[-1].transaction_id, limit=20)
+
+    Arguments:
+        instance (VersioningMixin): Versioned model instance.
+        per_page (int): Number of versions fetched per query when
+            iterating over the full history.
+    """
+
+    def __init__(self, instance, per_page=100):
+        self.instance = instance
+        self.per_page = per_page
+        return
+
+    @property
+    def sparse(self):
+        """
+        Whether versions are stored sparsely. Sparse rows are rebuilt
+        from the start of history, so windows over them are sliced
+        after loading all preceding versions.
+        """
+        return is_sparse(self.instance.__class__)
+
+    @property
+    def column(self):
+        """
+        Transaction column used for ordering versions.
+        """
+        version = version_class(self.instance.__class__)
+        return getattr(version, tx_column_name(self.instance))
+
+    def query(self, reverse=False, after=None, before=None):
+        """
+        Return ordered query for versions of the instance, read
+        through the replica session when one is active. For partitioned
+        models, buckets outside of the given bounds are skipped.
+
+        Args:
+            reverse (bool): Order from newest to oldest.
+            after (int): Transaction id versions are queried after.
+            before (int): Transaction id versions are queried before.
+        """
+        model = self.instance.__class__
+        session = object_session(self.instance)
+        reader = read_session(session)
+        if reader is session and partition_period(model) is None:
+            query = self.instance.versions
+        else:
+            version = version_class(model)
+            keys = [col.key for col in inspect(model).primary_key]
+            query = partition_query(reader, model, after=after, before=before).filter(*[
+                getattr(version, key) == value for key, value in zip(keys, identity(self.instance))
+            ]).order_by(self.column)
+        if reverse:
+            query = query.order_by(None).order_by(self.column.desc())
+        return query
+
+    def records(self, versions):
+        """
+        Wrap version objects in cached record proxies.
+
+        Args:
+            versions (list): Version objects for the instance.
+        """
+        return make_records(self.instance.__class__, versions, self.instance)
+
+    def page(self, after=None, before=None, limit=None):
+        """
+        Return records ordered by transaction, using keyset
+        pagination on transaction ids.
+
+        Args:
+            after (int): Only include versions after this transaction id.
+            before (int): Only include versions before this transaction id.
+            limit (int): Maximum number of records to return. When only
+                ``before`` is specified, the records closest to ``before``
+                are returned.
+        """
+        if self.sparse:
+            records = [
+                x for x in self.records(self.query().all())
+                if (after is None or x.transaction_id > after) and
+                (before is None or x.transaction_id < before)
+            ]
+            if limit is None:
+                return records
+            return records[-limit:] if before is not None and after is None else records[:limit]
+
+        reverse = before is not None and after is None
+        query = self.query(reverse=reverse, after=after, before=before)
+        if after is not None:
+            query = query.filter(self.column > after)
+        if before is not None:
+            query = query.filter(self.column < before)
+        if limit is not None:
+            query = query.limit(limit)
+
+        versions = query.all()
+        if reverse:
+            versions.reverse()
+        return self.records(versions)
+
+    def __len__(self):
+        return self.query().order_by(None).count()
+
+    def __bool__(self):
+        return self.query().first() is not None
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            if key.step not in (None, 1):
+                raise ValueError('History slices do not support steps.')
+            return self.window(key.start, key.stop)
+
+        if self.sparse:
+            return self.records(self.query().all())[key]
+        if key < 0:
+            versions = self.query(reverse=True).offset(-key - 1).limit(1).all()
+        else:
+            versions = self.query().offset(key).limit(1).all()
+        if not versions:
+            raise IndexError('History index out of range.')
+        return self.records(versions)[0]
+
+    def window(self, start=None, stop=None):
+        """
+        Return records between ``start`` and ``stop`` indices, with
+        the same semantics as list slicing.
+        """
+        if self.sparse:
+            return self.records(self.query().all())[start:stop]
+        start = 0 if start is None else start
+
+        # windows anchored at the end of history are read backwards
+        if start < 0 and (stop is None or stop < 0):
+            offset = 0 if stop is None else -stop
+            limit = -start - offset
+            if limit <= 0:
+                return []
+            versions = self.query(reverse=True).offset(offset).limit(limit).all()
+            versions.reverse()
+            return self.records(versions)
+
+        if start < 0 or (stop is not None and stop < 0):
+            start, stop, _ = slice(start, stop).indices(len(self))
+
+        query = self.query()
+        if stop is not None:
+            if stop <= start:
+                return []
+            query = query.limit(stop - start)
+        if start:
+            query = query.offset(start)
+        return self.records(query.all())
+
+    def iterate(self, reverse=False):
+        """
+        Iterate over records in pages of ``per_page`` versions,
+        holding only one page in memory at a time.
+
+        Args:
+            reverse (bool): Iterate from newest to oldest.
+        """
+        if self.sparse:
+            records = self.records(self.query().all())
+            for item in (reversed(records) if reverse else records):
+                yield item
+            return
+
+        name = tx_column_name(self.instance)
+        bound = None
+        while True:
+            query = self.query(reverse=reverse)
+            if bound is not None:
+                query = query.filter(self.column < bound if reverse else self.column > bound)
+            versions = query.limit(self.per_page).all()
+            for item in self.records(versions):
+                yield item
+            if len(versions) < self.per_page:
+                return
+            bound = getattr(versions[-1], name)
+        return
+
+    def changesets(self, columns=None):
+        """
+        Return changes introduced by every version, as an ordered
+        dictionary of changesets keyed by transaction id. History is
+        loaded with a single query selecting only the compared columns,
+        and all consecutive diffs are computed in one pass:
+
+        .. code-block:: python
+
+            >>> article.history.changesets(columns=['name'])
+            OrderedDict([(1, {'name': [None, 'a']}), (2, {'name': ['a', 'b']})])
+
+        Args:
+            columns (list): Attribute keys to compare. Defaults to all
+                versioned columns.
+        """
+        model = self.instance.__class__
+        version = version_class(model)
+        keys = [
+            prop.key for prop in versioned_column_properties(model)
+            if columns is None or prop.key in columns
+        ]
+        unknown = set(columns or []) - set(keys)
+        if unknown:
+            raise AssertionError('Unknown versioned columns for {}: {}'.format(
+                model.__name__, ', '.join(sorted(unknown))))
+
+        entities = [self.column] + [getattr(version, key) for key in keys]
+        sparse = self.sparse
+        if sparse:
+            entities.append(getattr(version, CHANGED))
+
+        result, state = OrderedDict(), {}
+        for row in self.query().with_entities(*entities):
+            stored = set(row[-1].split(',')) if sparse and row[-1] else None
+            changes = {}
+            for key, value in zip(keys, row[1:]):
+                if stored is not None and key not in stored:
+                    continue
+                old = state.get(key)
+                if old != value:
+                    changes[key] = [old, value]
+                    state[key] = value
+            result[row[0]] = changes
+        return result
+
+    def __iter__(self):
+        return self.iterate()
+
+    def __reversed__(self):
+        return self.iterate(reverse=True)
 
 
 # mixins
@@ -34,74 +642,201 @@ class VersioningMixin(object):
     """
     __versioned__ = {}
 
+    @classmethod
+    def record_class(cls):
+        """
+        Return cached record proxy class used for items
+        in :attr:`records`.
+        """
+        return record_class(cls)
+
     @property
+    @measured('modified')
     def modified(self):
         """
-        Return boolean describing if object has been modified.
+        Return boolean describing if object has been modified. The
+        result is memoized on the instance until a change to the
+        object is flushed or the instance is expired.
         """
-        return count_versions(self) > 0
+        info = inspect(self).info
+        if 'modified' not in info:
+            session = object_session(self)
+            if session is None:
+                return False
+            with session.no_autoflush:
+                query = self.history.query()
+                info['modified'] = query.session.query(query.exists()).scalar()
+        return info['modified']
 
     @property
+    @measured('changeset')
     def changeset(self):
         """
         Return SQLAlchemy-Continuum changeset for object.
         """
         return changeset(self)
 
-    @property
-    def records(self):
+    @measured('changesets')
+    def changesets(self, columns=None):
         """
-        Return list of records in versioning history.
+        Return changesets for all versions of object, keyed by
+        transaction id. See :meth:`History.changesets`.
+
+        Args:
+            columns (list): Attribute keys to compare.
         """
+        return self.history.changesets(columns=columns)
 
-        class VersionedInstanceMixin(object):
-            __abstract__ = True
+    @classmethod
+    def history_for(cls, items, session=None):
+        """
+        Load records for many objects in a single query, returning
+        a dictionary of record lists keyed by primary key (or tuple
+        of primary keys for composite keys):
 
-            @property
-            def previous(self):
-                return self.__version__.previous
+        .. code-block:: python
 
-            @property
-            def next(self):
-                return self.__version__.next
+            >>> history = Article.history_for(articles)
+            >>> history[articles[0].id]
+            [<ArticleRecord>, <ArticleRecord>]
 
-            @property
-            def index(self):
-                return self.__version__.index
+        Args:
+            items (list): Model instances or primary key values.
+            session (Session): Session to query with. Defaults to the
+                session of given instances or the model ``query``.
+        """
+        mapper = inspect(cls)
+        keys = [col.key for col in mapper.primary_key]
+        version = version_class(cls)
 
-            def revert(self):
-                self.__version__.revert()
-                return
+        # resolve identities for items
+        instances, idents = {}, []
+        for item in items:
+            if isinstance(item, cls):
+                if session is None:
+                    session = object_session(item)
+                ident = tuple(getattr(item, key) for key in keys)
+                instances[ident] = item
+            else:
+                ident = tuple(item) if isinstance(item, (tuple, list)) else (item,)
+            idents.append(ident)
 
-        # dynamically create new type with mixin functionality
-        VersionedClass = type(
-            '{}Record'.format(self.__class__.__name__),
-            (VersionedInstanceMixin, self.__class__), {}
-        )
+        if session is None:
+            session = cls.query.session
+        session = read_session(session)
 
-        # gather cols
-        columns = []
-        mapper = inspect(self.__class__)
-        for col in mapper.attrs:
-            if hasattr(col, 'columns'):
-                columns.append(col.columns[0].key)
+        def unwrap(ident):
+            return ident[0] if len(keys) == 1 else ident
+
+        result = OrderedDict((unwrap(ident), []) for ident in idents)
+        if not idents:
+            return result
+
+        # query versions for all items
+        if len(keys) == 1:
+            criteria = getattr(version, keys[0]).in_([ident[0] for ident in idents])
+        else:
+            criteria = or_(*[
+                and_(*[getattr(version, key) == value for key, value in zip(keys, ident)])
+                for ident in set(idents)
+            ])
+        query = partition_query(session, cls).filter(criteria).order_by(*[
+            getattr(version, key) for key in keys
+        ] + [getattr(version, tx_column_name(cls))])
+
+        # group records by parent
+        groups = OrderedDict()
+        for record in query:
+            ident = tuple(getattr(record, key) for key in keys)
+            groups.setdefault(ident, []).append(record)
+        for ident, versions in groups.items():
+            result[unwrap(ident)] = make_records(cls, versions, instances.get(ident))
+        return result
+
+    @classmethod
+    def as_of(cls, transaction_id=None, timestamp=None, session=None):
+        """
+        Return query over version table selecting the state of each
+        row at a given transaction or point in time. The single valid
+        version per primary key is selected in SQL, using the validity
+        strategy's ``end_transaction_id`` column where available:
+
+        .. code-block:: python
+
+            >>> Article.as_of(timestamp=datetime(2020, 1, 1)).filter_by(name='test').all()
+            [<ArticleVersion>]
 
-        # configure versioning
-        proxies = []
-        for idx in range(count_versions(self)):
-            record = self.versions[idx]
-
-            # get column data
-            data = {}
-            for k in columns:
-                if k in record.__dict__:
-                    data[k] = getattr(record, k)
-                else:
-                    data[k] = getattr(self, k)
-
-            # create new abstract object
-            item = VersionedClass(**data)
-            item.__version__ = record
-            proxies.append(item)
-
-        return proxies
+        Rows deleted as of the given point are excluded. Models with
+        sparse version storage aren't supported, since their version
+        rows leave unchanged columns empty.
+
+        Args:
+            transaction_id (int): Transaction id to reconstruct state at.
+            timestamp (datetime): Time to reconstruct state at. Resolved
+                to the latest transaction issued at or before it.
+            session (Session): Session to query with.
+        """
+        if (transaction_id is None) == (timestamp is None):
+            raise AssertionError('Exactly one of `transaction_id` or `timestamp` must be specified.')
+
+        if session is None:
+            session = cls.query.session
+        session = read_session(session)
+        version = version_class(cls)
+
+        # resolve transaction for timestamp, up front for partitioned
+        # models so that buckets can be pruned
+        if timestamp is not None:
+            transaction = versioning_manager.transaction_cls
+            transaction_id = session.query(func.max(transaction.id)).filter(transaction.issued_at <= timestamp)
+            if partition_period(cls) is not None:
+                transaction_id = transaction_id.scalar() or 0
+            else:
+                transaction_id = scalar_subquery(transaction_id)
+
+        query = versions_at(session, cls, transaction_id)
+        return query.filter(version.operation_type != Operation.DELETE)
+
+    @property
+    def history(self):
+        """
+        Return lazy :class:`History` view over versioning history.
+        """
+        return History(self)
+
+    @property
+    @measured('records')
+    def records(self):
+        """
+        Return list of read-only records in versioning history, served
+        from the history cache when one is configured.
+        """
+        session = object_session(self)
+        history_cache = component('cache', session) if session is not None else None
+        if history_cache is not None:
+            return cached_records(self, history_cache)
+        return self.history[:]
+
+
+# events
+# ------
+@event.listens_for(Session, 'after_flush')
+def invalidate_flushed(session, flush_context):
+    """
+    Drop memoized history state for versioned objects
+    changed during flush.
+    """
+    for obj in chain(session.new, session.dirty, session.deleted):
+        if isinstance(obj, VersioningMixin):
+            inspect(obj).info.pop('modified', None)
+    return
+
+
+@event.listens_for(VersioningMixin, 'expire', propagate=True)
+def invalidate_expired(target, attrs):
+    """
+    Drop memoized history state when instance is expired.
+    """
+    if attrs is None:
+        inspect(target).info.pop('modified', None)
+    return
@@ -0,0 +1,320 @@
+# -*- coding: utf-8 -*-
+#
+# Time-partitioned version storage
+#
+# ------------------------------------------------
+
+
+# imports
+# -------
+from datetime import datetime
+from collections import OrderedDict
+
+from sqlalchemy import BigInteger, Column, DateTime, MetaData, String, Table, and_, func, inspect, select, union_all
+from sqlalchemy_continuum import version_class, versioning_manager
+from sqlalchemy_continuum.utils import end_tx_column_name, option, tx_column_name
+
+from .cache import invalidate_all
+
+
+# config
+# ------
+PARTITION = 'partition'
+FORMATS = {'day': '%Y%m%d', 'month': '%Y%m', 'year': '%Y'}
+REGISTRY = 'version_partition'
+BUCKETS = MetaData()
+
+
+# helpers
+# -------
+def partition_period(model):
+    """
+    Return period versions for model are partitioned by, which is
+    enabled via the ``partition`` key in ``__versioned__``:
+
+    .. code-block:: python
+
+        class Article(db.Model, VersioningMixin):
+            __versioned__ = {'partition': 'month'}
+
+    New versions are always written to the version table, which acts
+    as the current bucket. :func:`rotate` moves closed versions from
+    past periods into one table per period (``article_version_202401``),
+    and :func:`drop_partitions` drops whole buckets. The latest version
+    of each row is never moved, so writes, ``modified`` and retention
+    only touch the version table, while ``records``, ``history``,
+    ``as_of`` and exports include the buckets they need.
+
+    Args:
+        model (type): Versioned model class.
+    """
+    options = getattr(model, '__versioned__', None) or {}
+    period = options.get(PARTITION)
+    if period is not None and period not in FORMATS:
+        raise AssertionError('Unsupported partition period {!r} for {}. Use one of: {}'.format(
+            period, model.__name__, ', '.join(sorted(FORMATS))))
+    return period
+
+
+def period_start(moment, period):
+    """
+    Truncate datetime to the start of its period.
+    """
+    if period == 'year':
+        return datetime(moment.year, 1, 1)
+    if period == 'month':
+        return datetime(moment.year, moment.month, 1)
+    return datetime(moment.year, moment.month, moment.day)
+
+
+def period_next(start, period):
+    """
+    Return start of the period following ``start``.
+    """
+    if period == 'year':
+        return datetime(start.year + 1, 1, 1)
+    if period == 'month':
+        return datetime(start.year + start.month // 12, start.month % 12 + 1, 1)
+    return datetime.fromordinal(start.toordinal() + 1)
+
+
+def registry(metadata, info=None):
+    """
+    Return table recording partition buckets and their transaction
+    bounds, defining it on metadata on first use.
+
+    Args:
+        metadata (MetaData): Metadata holding version tables.
+        info (dict): Table info, such as the bind key of version tables.
+    """
+    if REGISTRY in metadata.tables:
+        return metadata.tables[REGISTRY]
+    return Table(
+        REGISTRY, metadata,
+        Column('version_table', String(255), primary_key=True),
+        Column('bucket', String(255), primary_key=True),
+        Column('starts_at', DateTime, nullable=False),
+        Column('ends_at', DateTime, nullable=False),
+        Column('min_transaction_id', BigInteger, nullable=False),
+        Column('max_transaction_id', BigInteger, nullable=False),
+        Column('max_end_transaction_id', BigInteger, nullable=False),
+        info=dict(info or {}),
+    )
+
+
+def configure_partitions():
+    """
+    Define partition registry for models with partitioned versions.
+    """
+    for model, version in versioning_manager.version_class_map.items():
+        if partition_period(model) is None:
+            continue
+        if option(model, 'strategy') != 'validity':
+            raise AssertionError('Partitioned versions for {} require the validity strategy.'.format(model.__name__))
+        registry(version.__table__.metadata, version.__table__.info)
+    return
+
+
+def bucket_table(model, name):
+    """
+    Return table for partition bucket of model, with the same
+    columns and primary key as its version table.
+    """
+    if name not in BUCKETS.tables:
+        vtable = version_class(model).__table__
+        Table(name, BUCKETS, *[col.copy() for col in vtable.columns])
+    return BUCKETS.tables[name]
+
+
+# reads
+# -----
+def buckets(session, model, after=None, before=None, at=None):
+    """
+    Return bucket tables for model that can hold versions within the
+    given bounds, ordered by transaction.
+
+    Args:
+        session (Session): Session to query registry with.
+        model (type): Versioned model class.
+        after (int): Only include buckets with versions after this
+            transaction id.
+        before (int): Only include buckets with versions before this
+            transaction id.
+        at (int): Only include buckets with versions valid at this
+            transaction id.
+    """
+    version = version_class(model)
+    table = registry(version.__table__.metadata)
+    criteria = [table.c.version_table == version.__table__.name]
+    if after is not None:
+        criteria.append(table.c.max_transaction_id > after)
+    if before is not None:
+        criteria.append(table.c.min_transaction_id < before)
+    if at is not None:
+        criteria.extend([table.c.min_transaction_id <= at, table.c.max_end_transaction_id > at])
+    query = select([table.c.bucket]).where(and_(*criteria)).order_by(table.c.min_transaction_id)
+    rows = session.connection(mapper=inspect(version)).execute(query)
+    return [bucket_table(model, row[0]) for row in rows]
+
+
+def partitioned(session, model, **bounds):
+    """
+    Return selectable over versions of model across its version table
+    and relevant buckets, or ``None`` if model isn't partitioned or
+    no buckets are relevant. Bounds are passed to :func:`buckets`.
+    """
+    if partition_period(model) is None:
+        return
+    tables = buckets(session, model, **bounds)
+    if not tables:
+        return
+    vtable = version_class(model).__table__
+    return union_all(
+        select([vtable]), *[select([table]) for table in tables]
+    ).alias(vtable.name + '_partitioned')
+
+
+def partition_query(session, model, **bounds):
+    """
+    Return query for version objects of model, selecting from
+    relevant partition buckets as well as the version table.
+    """
+    query = session.query(version_class(model))
+    source = partitioned(session, model, **bounds)
+    if source is not None:
+        query = query.select_entity_from(source)
+    return query
+
+
+def adjacent(session, model, version_obj, reverse=False):
+    """
+    Return version following (or preceding, with ``reverse``) a version
+    object in the history of its row, across partition buckets.
+    """
+    version = version_class(model)
+    tx_column = getattr(version, tx_column_name(model))
+    tx = getattr(version_obj, tx_column_name(model))
+    bounds = dict(before=tx) if reverse else dict(after=tx)
+    query = partition_query(session, model, **bounds).filter(
+        tx_column < tx if reverse else tx_column > tx,
+        *[getattr(version, col.key) == getattr(version_obj, col.key) for col in inspect(model).primary_key]
+    )
+    return query.order_by(tx_column.desc() if reverse else tx_column).first()
+
+
+# maintenance
+# -----------
+def rotate(session, model, before=None):
+    """
+    Move closed versions written by transactions issued before ``before``
+    into one bucket table per period, creating buckets as needed.
+    Returns the number of moved versions per bucket. Changes are not
+    committed.
+
+    Args:
+        session (Session): Session to move versions with.
+        model (type): Versioned model class.
+        before (datetime): Only move versions issued before this time.
+            Defaults to the start of the current period.
+    """
+    period = partition_period(model)
+    if period is None:
+        raise AssertionError('Versions for {} are not partitioned.'.format(model.__name__))
+    if before is None:
+        before = period_start(datetime.utcnow(), period)
+
+    version = version_class(model)
+    vtable = version.__table__
+    transaction = versioning_manager.transaction_cls.__table__
+    tx_column = vtable.c[tx_column_name(model)]
+    end_column = vtable.c[end_tx_column_name(model)]
+    table = registry(vtable.metadata)
+    conn = session.connection(mapper=inspect(version))
+
+    def closed(start, end):
+        return and_(end_column.isnot(None), tx_column.in_(
+            select([transaction.c.id]).where(and_(
+                transaction.c.issued_at >= start,
+                transaction.c.issued_at < end,
+            ))
+        ))
+
+    moved, cursor = OrderedDict(), datetime.min
+    while True:
+        first = conn.execute(
+            select([func.min(transaction.c.issued_at)])
+            .select_from(vtable.join(transaction, transaction.c.id == tx_column))
+            .where(closed(cursor, before))
+        ).scalar()
+        if first is None:
+            break
+        start = period_start(first, period)
+        end = min(period_next(start, period), before)
+        criteria = closed(start, end)
+
+        # copy versions to bucket
+        bucket = bucket_table(model, '{}_{}'.format(vtable.name, start.strftime(FORMATS[period])))
+        bucket.create(conn, checkfirst=True)
+        count = conn.execute(bucket.insert().from_select(
+            [col.name for col in vtable.c], select([vtable]).where(criteria)
+        )).rowcount
+        conn.execute(vtable.delete().where(criteria))
+
+        # record bucket bounds
+        bounds = conn.execute(select([
+            func.min(bucket.c[tx_column.key]),
+            func.max(bucket.c[tx_column.key]),
+            func.max(bucket.c[end_column.key]),
+        ])).first()
+        conn.execute(table.delete().where(and_(
+            table.c.version_table == vtable.name,
+            table.c.bucket == bucket.name,
+        )))
+        conn.execute(table.insert(), dict(
+            version_table=vtable.name,
+            bucket=bucket.name,
+            starts_at=start,
+            ends_at=period_next(start, period),
+            min_transaction_id=bounds[0],
+            max_transaction_id=bounds[1],
+            max_end_transaction_id=bounds[2],
+        ))
+        moved[bucket.name] = moved.get(bucket.name, 0) + count
+        cursor = end
+    return moved
+
+
+def drop_partitions(session, model, before):
+    """
+    Drop partition buckets for model covering periods that end
+    before ``before``, removing their versions without row-by-row
+    deletes. Returns names of dropped buckets. Changes are not committed.
+
+    Args:
+        session (Session): Session to drop buckets with.
+        model (type): Versioned model class.
+        before (datetime): Drop buckets for periods ending at or
+            before this time.
+    """
+    version = version_class(model)
+    vtable = version.__table__
+    table = registry(vtable.metadata)
+    conn = session.connection(mapper=inspect(version))
+    names = [row[0] for row in conn.execute(select([table.c.bucket]).where(and_(
+        table.c.version_table == vtable.name,
+        table.c.ends_at <= before,
+    )).order_by(table.c.starts_at))]
+    if not names:
+        return names
+
+    invalidate_all(session)
+    for name in names:
+        bucket = bucket_table(model, name)
+        bucket.drop(conn, checkfirst=True)
+        BUCKETS.remove(bucket)
+    conn.execute(table.delete().where(and_(
+        table.c.version_table == vtable.name,
+        table.c.bucket.in_(names),
+    )))
+    session.expire_all()
+    return names
@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+#
+# Pausing version generation
+#
+# ------------------------------------------------
+
+
+# imports
+# -------
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from sqlalchemy_continuum import UnitOfWork
+from sqlalchemy_continuum.utils import is_modified_or_deleted, versioned_objects
+
+from .bulk import check_bind, create_transaction, record_versions
+
+
+# config
+# ------
+PAUSED = 'continuum.paused'
+
+
+# helpers
+# -------
+def paused_frame(session, obj):
+    """
+    Return innermost active pause frame on session covering the
+    class of object, or ``None`` if versioning isn't paused for it.
+    """
+    for frame in reversed(session.info.get(PAUSED) or []):
+        if frame['models'] is None or isinstance(obj, frame['models']):
+            return frame
+    return
+
+
+# unit of work
+# ------------
+class PausableUnitOfWork(UnitOfWork):
+    """
+    SQLAlchemy-Continuum unit of work skipping version generation for
+    objects whose models are paused on the flushing session via
+    :func:`paused`. Skipped rows are remembered on the pause frame, so
+    that summarizing versions can be written when the block exits.
+    """
+
+    def is_modified(self, session):
+        if not session.info.get(PAUSED):
+            return super(PausableUnitOfWork, self).is_modified(session)
+        return any(
+            is_modified_or_deleted(obj) for obj in versioned_objects(session)
+            if paused_frame(session, obj) is None
+        ) or any(self.manager.plugins.is_session_modified(session))
+
+    def skip_paused(self, session):
+        """
+        Drop pending operations for paused models, recording their
+        rows on the pause frame.
+        """
+        if not session.info.get(PAUSED):
+            return
+        for key, operation in list(self.operations.items()):
+            frame = paused_frame(session, operation.target)
+            if frame is not None:
+                frame['touched'].setdefault(key[0], OrderedDict())[key[1]] = True
+                del self.operations[key]
+        return
+
+    def process_after_flush(self, session):
+        self.skip_paused(session)
+        return super(PausableUnitOfWork, self).process_after_flush(session)
+
+
+# context
+# -------
+@contextmanager
+def paused(session, models=None, summarize=False):
+    """
+    Suppress version generation for models on a single session while
+    the managed block runs. Other sessions (and threads using scoped
+    sessions) keep versioning as usual:
+
+    .. code-block:: python
+
+        with paused(db.session, models=[Item], summarize=True):
+            for item in db.session.query(Item):
+                item.name = item.name.strip()
+            db.session.commit()
+        db.session.commit()
+
+    With ``summarize`` set, a single version recording the final state
+    of every affected row is written in one transaction when the block
+    exits (uncommitted, like other session changes).
+
+    Args:
+        session (Session): Session to pause versioning on.
+        models (list): Models to pause versioning for. Defaults to all
+            versioned models.
+        summarize (bool): Record one summarizing version per affected row
+            at the end of the block.
+    """
+    frame = dict(
+        models=tuple(models) if models is not None else None,
+        touched=OrderedDict(),
+    )
+    session.info.setdefault(PAUSED, []).append(frame)
+    try:
+        yield frame
+        session.flush()
+    finally:
+        session.info[PAUSED].remove(frame)
+        if not session.info[PAUSED]:
+            session.info.pop(PAUSED)
+
+    if summarize and frame['touched']:
+        for model in frame['touched']:
+            check_bind(model)
+        tx = create_transaction(session)
+        for model, idents in frame['touched'].items():
+            keys = list(idents)
+            if all(len(ident) == 1 for ident in keys):
+                keys = [ident[0] for ident in keys]
+            record_versions(session, model, keys, tx)
+    return
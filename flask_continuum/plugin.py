@@ -7,27 +7,48 @@
 
 # imports
 # -------
+import time
+import atexit
 from flask import Flask, appcontext_pushed
-from flask.globals import _app_ctx_stack, _request_ctx_stack
 from sqlalchemy_continuum.plugins import FlaskPlugin
-from sqlalchemy_continuum import make_versioned
+from sqlalchemy_continuum import make_versioned, versioning_manager
 from sqlalchemy.orm import configure_mappers
+from sqlalchemy.orm.mapper import Mapper
 from sqlalchemy import event
 
+from .mixins import configure_records
+from .bulk import bulk_insert, revert_to, revert_transaction
+from .retention import compact
+from .cli import cli
+from .identity import UserResolver, login_user_id
+from .archive import Archive, install as install_archive
+from .cache import HistoryCache, install as install_cache
+from .metrics import MetricsPlugin, Stats, install
+from .partition import configure_partitions, drop_partitions, partition_period, rotate
+from .replica import ReadReplica, install as install_replica
+from .pause import paused
+from .sparse import SparsePlugin
+from .state import extension
+from .writer import DeferredUnitOfWork, VersionWriter, install as install_writer
+
 
 # helpers
 # -------
-def fetch_current_user_id():
-    if _app_ctx_stack.top is None or _request_ctx_stack.top is None:
-        return
-    try:
-        from flask_login import current_user
-        return current_user.id
-    except Exception:
+fetch_current_user_id = UserResolver(login_user_id)
+
+
+def current_user_id():
+    """
+    Resolve user for transactions with the resolvers of the
+    current application's extension.
+    """
+    ext = extension()
+    if ext is None:
         return
+    return ext.current_user()
 
 
-CONFIGURED = False
+VERSIONED = False
 
 
 # plugin
@@ -79,6 +100,81 @@ class Continuum(object):
         app = Flask(__name__)
         continuum.init_app(app)
 
+    SQLAlchemy mappers for versioning tables are configured once, when
+    the first connection to the database is made. Subsequent connections
+    carry no versioning setup overhead. Record classes, archive binds
+    and partition registries are set up whenever mappers are configured,
+    so this also holds for engines connected before the extension was
+    initialized. Latency for the first connection is recorded on the
+    plugin:
+
+    .. code-block:: python
+
+        >>> continuum.timings
+        {'configure': 0.0123, 'connect': 0.0125}
+
+    For write-heavy applications, version rows can be written after commit
+    by a background worker instead of inside each flush. Pending versions
+    are written on interpreter shutdown, or explicitly via ``drain()``:
+
+    .. code-block:: python
+
+        continuum = Continuum(app, db, deferred=True, flush_interval=0.5)
+        ...
+        continuum.drain()
+
+    The user recorded on transactions is resolved once per request and
+    cached on the request context. By default, ``flask_login.current_user``
+    is used; other identity sources can be chained via ``current_user``,
+    with the first resolver returning a value taking precedence:
+
+    .. code-block:: python
+
+        from flask_continuum.identity import g_user_id, header_user_id, jwt_user_id
+
+        continuum = Continuum(app, db, current_user=[
+            g_user_id('user_id'), jwt_user_id, header_user_id('X-User-Id'),
+        ])
+
+    To measure how much commit and read latency comes from versioning,
+    enable metrics collection. Counters are exposed on the extension and
+    via Flask signals:
+
+    .. code-block:: python
+
+        from flask_continuum.metrics import versions_flushed
+
+        continuum = Continuum(app, db, metrics=True)
+        versions_flushed.connect(lambda app, **kwargs: print(kwargs), app)
+        ...
+        continuum.stats.as_dict()
+
+    Materialized histories read via ``records`` can be cached across
+    requests, and are invalidated when changes to their rows commit:
+
+    .. code-block:: python
+
+        from flask_continuum.cache import MemoryCache
+
+        continuum = Continuum(app, db, cache=MemoryCache(maxsize=10000))
+
+    History reads and exports can be routed to a read-only replica,
+    given as an engine or as a Flask-SQLAlchemy bind key, with writes
+    staying on the primary session:
+
+    .. code-block:: python
+
+        app.config['SQLALCHEMY_BINDS'] = {'replica': REPLICA_URL}
+        continuum = Continuum(app, db, read_engine='replica')
+
+    To keep history out of the application database, version tables
+    and the transaction table can be stored on a separate bind:
+
+    .. code-block:: python
+
+        app.config['SQLALCHEMY_BINDS'] = {'history': ARCHIVE_URL}
+        continuum = Continuum(app, db, archive='history')
+
     Finally, to associate all transactions with users from a user table in
     the application database, you can set the `user_cls` parameter to the
     name of the table where users are stored:
@@ -94,21 +190,55 @@ class Continuum(object):
         db (SQLAlchemy): SQLAlchemy extension to associate with plugin.
         user_cls (str): Name of user class used in application.
         engine (Engine): SQLAlchemy engine to associate with plugin.
-        current_user (callable): Callable object to determine user associated
-                                 with request.
+        current_user (callable, list): Callable object to determine user associated
+                                 with request, or list of resolvers tried in order.
+                                 Resolved ids are cached per request.
         plugins (list): List of other SQLAlchemy-Continuum plugins to install.
             See: `https://sqlalchemy-continuum.readthedocs.io/en/latest/plugins.html`_
             for more information.
+        deferred (bool): Capture version rows in memory at flush and write
+            them in batches from a background thread after commit.
+        queue_size (int): Maximum number of committed transactions held in
+            memory when ``deferred`` is set.
+        flush_interval (float): Maximum number of seconds deferred versions
+            wait before being written.
+        metrics (bool): Collect versioning overhead metrics in ``stats``
+            and send ``flask_continuum.metrics`` signals.
+        cache (HistoryCache): History cache, or cache backend to wrap in
+            a :class:`HistoryCache`, used for ``records`` reads.
+        read_engine (Engine, str): Engine, or Flask-SQLAlchemy bind key,
+            to route history reads to.
+        archive (str): Flask-SQLAlchemy bind key to store version and
+            transaction tables in.
 
     """
 
-    def __init__(self, app=None, db=None, migrate=None, user_cls=None, engine=None, current_user=fetch_current_user_id, plugins=[]):
+    def __init__(self, app=None, db=None, migrate=None, user_cls=None, engine=None, current_user=fetch_current_user_id, plugins=[],
+                 deferred=False, queue_size=1000, flush_interval=1.0, metrics=False,
+                 cache=None, read_engine=None, archive=None):
         self.db = None
         self.migrate = None
         self.app = None
         self.engine = engine
         self.user_cls = user_cls
+        if not isinstance(current_user, UserResolver):
+            resolvers = current_user if isinstance(current_user, (list, tuple)) else [current_user]
+            current_user = UserResolver(*resolvers)
         self.current_user = current_user
+        self.timings = dict(configure=None, connect=None)
+        self.writer = None
+        self.deferred = dict(queue_size=queue_size, flush_interval=flush_interval) if deferred else None
+        self.stats = Stats() if metrics else None
+        if cache is not None and not isinstance(cache, HistoryCache):
+            cache = HistoryCache(cache)
+        self.cache = cache
+        self.read_engine = read_engine
+        self.replica = None
+        self.archive = Archive(archive) if archive is not None else None
+
+        # configure versioning support once, with features
+        # resolved per application from the extension
+        self.versioned(plugins)
 
         # arg mismatch
         if app is not None and \
@@ -127,13 +257,6 @@ class Continuum(object):
         if app is not None:
             self.init_app(app)
 
-        # configure versioning support
-        make_versioned(
-            user_cls=self.user_cls,
-            plugins=[
-                FlaskPlugin(current_user_id_factory=self.current_user)
-            ] + list(plugins)
-        )
         return
 
     def init_app(self, app, db=None):
@@ -148,6 +271,8 @@ class Continuum(object):
             self.init_db(db)
 
         self.app = app
+        app.extensions['continuum'] = self
+        app.cli.add_command(cli)
 
         # configure engine mappers on first connection
         engine = self.engine
@@ -168,7 +293,33 @@ class Continuum(object):
             if db.app is None:
                 db.app = app
 
-            engine = db.engine
+            engine = db.get_engine(app)
+
+        # collect versioning metrics
+        if self.stats is not None:
+            self.stats.app = app
+            install(self.stats, engine)
+
+        # cache history reads
+        install_cache()
+
+        # route history reads to replica
+        install_replica()
+        if self.read_engine is not None:
+            read_engine = self.read_engine
+            if isinstance(read_engine, str):
+                read_engine = (self.db or app.extensions['sqlalchemy']).get_engine(app, bind=read_engine)
+            self.replica = ReadReplica(read_engine)
+
+        # store history in separate database
+        if self.archive is not None:
+            install_archive(self.archive)
+            engine = (self.db or app.extensions['sqlalchemy']).get_engine(app, bind=self.archive.bind_key)
+
+        # write versions in background
+        install_writer()
+        if self.deferred is not None:
+            self.init_writer(engine)
 
         # configure mappers if outside of app context
         if self.migrate is not None:
@@ -177,13 +328,259 @@ class Continuum(object):
                 self.configure()
                 return config
 
-        # configure mappers on app start
-        @event.listens_for(engine, "connect")
+        # set up versioning helpers whenever mappers are configured
+        event.listen(Mapper, 'after_configured', self.setup)
+        if not Mapper._new_mappers:
+            self.setup()
+
+        # configure mappers on the first pool connection, for timing
+        @event.listens_for(engine, "first_connect")
         def do_connect(dbapi_connection, connection_record):
+            start = time.time()
             self.configure()
+            self.timings['connect'] = time.time() - start
             return
         return
 
+    def init_writer(self, engine):
+        """
+        Install background writer for deferred versioning.
+
+        Args:
+            engine (Engine): Engine used for writing versions.
+        """
+        self.writer = VersionWriter(engine, cache=self.cache, **self.deferred)
+        atexit.register(self.writer.stop)
+        return
+
+    def versioned(self, plugins):
+        """
+        Set up SQLAlchemy-Continuum for versioned models. This happens
+        once per process, with features such as metrics, caches and
+        deferred writing enabled per application by the extension
+        registered on it. Plugins given to later extensions are added
+        to the plugins already in use.
+
+        Args:
+            plugins (list): Other SQLAlchemy-Continuum plugins to install.
+        """
+        global VERSIONED
+        if VERSIONED:
+            for plugin in plugins:
+                if plugin not in list(versioning_manager.plugins):
+                    versioning_manager.plugins.append(plugin)
+            if self.user_cls is not None:
+                versioning_manager.user_cls = self.user_cls
+            return
+
+        make_versioned(
+            user_cls=self.user_cls,
+            plugins=[
+                MetricsPlugin(),
+                FlaskPlugin(current_user_id_factory=current_user_id),
+                SparsePlugin(),
+            ] + list(plugins)
+        )
+        versioning_manager.uow_class = DeferredUnitOfWork
+        VERSIONED = True
+        return
+
+    def drain(self):
+        """
+        Block until all deferred versions have been written.
+        """
+        if self.writer is not None:
+            self.writer.drain()
+        return
+
+    def session(self, session=None):
+        """
+        Return session for bulk operations, defaulting to the
+        session of the Flask-SQLAlchemy extension.
+
+        Args:
+            session (Session): Explicit session to use.
+        """
+        if session is not None:
+            return session
+        if self.db is None:
+            raise AssertionError(
+                'Flask-Continuum bulk operations require a session. Either '
+                'instantiate Continuum plugin with `db` argument (from Flask-SQLAlchemy) '
+                'or pass `session` to the operation.')
+        return self.db.session
+
+    def bulk_insert(self, model, rows, batch_size=1000, session=None):
+        """
+        Insert many rows for a versioned model, writing their version
+        rows alongside them with executemany-sized batches and a single
+        transaction row per batch. Changes are not committed:
+
+        .. code-block:: python
+
+            >>> continuum.bulk_insert(Article, [
+            ...     dict(id=1, name='one'),
+            ...     dict(id=2, name='two'),
+            ... ])
+            2
+            >>> db.session.commit()
+
+        Args:
+            model (type): Versioned model class.
+            rows (iterable): Dictionaries of column values keyed by attribute
+                name. Including primary keys enables executemany for parent rows.
+            batch_size (int): Number of rows written per batch.
+            session (Session): Session to write with.
+        """
+        return bulk_insert(self.session(session), model, rows, batch_size=batch_size)
+
+    def paused(self, models=None, summarize=False, session=None):
+        """
+        Context manager suppressing version generation for models on
+        the current session, for migrations and backfills. Optionally,
+        one summarizing version per affected row is recorded when the
+        block exits:
+
+        .. code-block:: python
+
+            with continuum.paused(models=[Article], summarize=True):
+                for article in Article.query:
+                    article.slug = slugify(article.name)
+            db.session.commit()
+
+        Args:
+            models (list): Models to pause versioning for. Defaults to all
+                versioned models.
+            summarize (bool): Record one summarizing version per affected
+                row at the end of the block.
+            session (Session): Session to pause versioning on.
+        """
+        return paused(self.session(session), models=models, summarize=summarize)
+
+    def revert_to(self, model, transaction_id, criteria=None, session=None):
+        """
+        Restore all rows of a versioned model changed after a transaction
+        to their state at that transaction, with set-based statements. The
+        revert itself is recorded as a new transaction. Changes are not
+        committed:
+
+        .. code-block:: python
+
+            >>> ArticleVersion = version_class(Article)
+            >>> continuum.revert_to(Article, 1024, criteria=[ArticleVersion.name.like('draft%')])
+            40000
+            >>> db.session.commit()
+
+        Args:
+            model (type): Versioned model class.
+            transaction_id (int): Transaction id to restore rows to.
+            criteria (list): Criteria against the version class limiting
+                reverted rows to those with matching versions.
+            session (Session): Session to revert rows with.
+        """
+        return revert_to(self.session(session), model, transaction_id, criteria=criteria)
+
+    def revert_transaction(self, transaction_id, models=None, session=None):
+        """
+        Undo a transaction, restoring every versioned row it touched
+        to its prior state with set-based statements. Returns the number
+        of reverted rows per model. Changes are not committed:
+
+        .. code-block:: python
+
+            >>> continuum.revert_transaction(1024)
+            {<class 'Article'>: 40000}
+            >>> db.session.commit()
+
+        Args:
+            transaction_id (int): Transaction id to undo.
+            models (list): Versioned models to revert rows for. Defaults
+                to all versioned models.
+            session (Session): Session to revert rows with.
+        """
+        return revert_transaction(self.session(session), transaction_id, models=models)
+
+    def compact(self, models=None, session=None, **kwargs):
+        """
+        Apply retention policies declared via ``__retention__`` on versioned
+        models, removing expired versions in chunks. Returns a dictionary
+        with the number of versions removed per model:
+
+        .. code-block:: python
+
+            class Article(db.Model, VersioningMixin):
+                __versioned__ = {}
+                __retention__ = {'keep_last': 100}
+
+            >>> continuum.compact()
+            {<class 'Article'>: 1024}
+
+        Args:
+            models (list): Models to compact. Defaults to all versioned
+                models declaring a retention policy.
+            session (Session): Session to run compaction with.
+            kwargs: Additional arguments to
+                :func:`flask_continuum.retention.compaction`.
+        """
+        session = self.session(session)
+        if models is None:
+            models = [
+                model for model in versioning_manager.version_class_map
+                if getattr(model, '__retention__', None)
+            ]
+        return dict(
+            (model, compact(session, model, **kwargs))
+            for model in models
+        )
+
+    def rotate(self, models=None, before=None, session=None):
+        """
+        Move closed versions of partitioned models from past periods
+        into per-period bucket tables. Returns the number of moved
+        versions per bucket for each model. Changes are not committed:
+
+        .. code-block:: python
+
+            class Article(db.Model, VersioningMixin):
+                __versioned__ = {'partition': 'month'}
+
+            >>> continuum.rotate()
+            {<class 'Article'>: {'article_version_202401': 1024}}
+            >>> db.session.commit()
+
+        Args:
+            models (list): Models to rotate. Defaults to all versioned
+                models with a partition period.
+            before (datetime): Only move versions issued before this time.
+                Defaults to the start of the current period.
+            session (Session): Session to move versions with.
+        """
+        session = self.session(session)
+        if models is None:
+            models = [
+                model for model in versioning_manager.version_class_map
+                if partition_period(model) is not None
+            ]
+        return dict(
+            (model, rotate(session, model, before=before))
+            for model in models
+        )
+
+    def drop_partitions(self, model, before, session=None):
+        """
+        Drop partition buckets of a model for periods ending before
+        a given time, discarding their versions in one statement per
+        bucket. Returns names of dropped buckets. Changes are not
+        committed.
+
+        Args:
+            model (type): Versioned model class.
+            before (datetime): Drop buckets for periods ending at or
+                before this time.
+            session (Session): Session to drop buckets with.
+        """
+        return drop_partitions(self.session(session), model, before)
+
     def init_db(self, db):
         self.db = db
         return
@@ -193,5 +590,25 @@ class Continuum(object):
         return
 
     def configure(self, *args, **kwargs):
+        """
+        Configure SQLAlchemy mappers, which triggers :meth:`setup`.
+        This runs automatically on the first connection to the database,
+        and the time it took is stored in ``timings['configure']`` (with
+        the total first-connection overhead in ``timings['connect']``).
+        """
+        start = time.time()
         configure_mappers()
+        self.timings['configure'] = time.time() - start
+        return
+
+    def setup(self):
+        """
+        Build versioning record classes, place versioning tables on the
+        archive bind and define partition registries. This runs after
+        SQLAlchemy mappers are configured, independently of connections.
+        """
+        configure_records()
+        if self.archive is not None:
+            self.archive.bind_tables()
+        configure_partitions()
         return
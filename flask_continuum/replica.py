@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+#
+# Routing history reads to a replica
+#
+# ------------------------------------------------
+
+
+# imports
+# -------
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session, sessionmaker
+
+from .state import component
+
+
+# config
+# ------
+READER = 'continuum.reader'
+WRITTEN = 'continuum.written'
+PRIMARY = 'continuum.primary'
+
+
+# replica
+# -------
+class ReadReplica(object):
+    """
+    Router sending history reads (``records``, ``history``, ``modified``,
+    ``as_of``, ``history_for`` and exports) to a dedicated engine, such as
+    a read-only replica of the application database:
+
+    .. code-block:: python
+
+        continuum = Continuum(app, db, read_engine=create_engine(REPLICA_URL))
+
+    Each session reads through its own replica session, which is
+    discarded when the primary transaction ends, so a transaction sees
+    a consistent replica snapshot. Records used after that reload their
+    version objects through the next replica session. Once a session
+    has flushed changes, reads fall back to it until it commits or rolls
+    back, so writers always see their own changes. Replica sessions never
+    flush; reverting a record read from the replica writes to the primary
+    session.
+
+    Arguments:
+        engine (Engine): Engine to read history with.
+    """
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.factory = sessionmaker(bind=engine, autoflush=False, expire_on_commit=False)
+        event.listen(self.factory, 'before_flush', self.reject)
+        return
+
+    def session(self, session):
+        """
+        Return session to read history for primary session with.
+
+        Args:
+            session (Session): Primary session.
+        """
+        if session is None or session.info.get(WRITTEN):
+            return session
+        reader = session.info.get(READER)
+        if reader is None:
+            reader = session.info[READER] = self.factory()
+            reader.info[PRIMARY] = session
+        return reader
+
+    # events
+    def reject(self, session, flush_context, instances):
+        if session.new or session.dirty or session.deleted:
+            raise AssertionError('History read sessions are read-only.')
+        return
+
+
+# events
+# ------
+def flushed(session, flush_context):
+    if PRIMARY not in session.info:
+        session.info[WRITTEN] = True
+    return
+
+
+def ended(session, transaction):
+    if transaction.parent is not None:
+        return
+    session.info.pop(WRITTEN, None)
+    reader = session.info.pop(READER, None)
+    if reader is not None:
+        reader.close()
+    return
+
+
+EVENTS = (('after_flush', flushed), ('after_transaction_end', ended))
+
+
+# helpers
+# -------
+def install():
+    """
+    Track session writes and transactions, for routing history reads
+    of applications configured with a replica.
+    """
+    for name, listener in EVENTS:
+        if not event.contains(Session, name, listener):
+            event.listen(Session, name, listener)
+    return
+
+
+def read_session(session):
+    """
+    Return session history reads for primary session should use,
+    which is the session itself when its application has no replica.
+    """
+    if session is None or PRIMARY in session.info:
+        return session
+    replica = component('replica', session)
+    if replica is None:
+        return session
+    return replica.session(session)
+
+
+def write_session(obj):
+    """
+    Return primary session for object, which may have been
+    loaded through a replica session.
+    """
+    session = object_session(obj)
+    if session is None:
+        return
+    return session.info.get(PRIMARY, session)
@@ -0,0 +1,376 @@
+# -*- coding: utf-8 -*-
+#
+# History retention
+#
+# ------------------------------------------------
+
+
+# imports
+# -------
+from datetime import datetime
+
+from sqlalchemy import and_, bindparam, func, inspect, select, tuple_
+from sqlalchemy_continuum import Operation, version_class, versioning_manager
+from sqlalchemy_continuum.utils import end_tx_column_name, option, tx_column_name, versioned_column_properties
+
+from .cache import invalidate_all
+from .mixins import scalar_subquery
+from .partition import partition_period
+from .sparse import CHANGED, is_sparse
+
+
+# helpers
+# -------
+def retention_policy(model):
+    """
+    Return retention policy declared for model via ``__retention__``,
+    which can contain the following keys:
+
+    * ``keep_last`` - Number of most recent versions to keep per row.
+    * ``ttl`` - ``timedelta`` describing how long versions are kept.
+    * ``per_day`` - Keep only the latest version per row for each day.
+
+    Versions matching any of the policies are removed, with the latest
+    version for every row always retained:
+
+    .. code-block:: python
+
+        class Article(db.Model, VersioningMixin):
+            __versioned__ = {}
+            __retention__ = {
+                'keep_last': 100,
+                'ttl': timedelta(days=365),
+            }
+
+    Args:
+        model (type): Versioned model class.
+    """
+    policy = getattr(model, '__retention__', None) or {}
+    unknown = set(policy) - set(['keep_last', 'ttl', 'per_day'])
+    if unknown:
+        raise AssertionError('Unknown retention policy options for {}: {}'.format(
+            model.__name__, ', '.join(sorted(unknown))))
+    return policy
+
+
+def unpartitioned(model):
+    """
+    Ensure versions for model are stored in a single version table.
+    Retention and vacuum only cover the version table, so they are
+    rejected for partitioned models, whose closed versions are
+    dropped per period via :func:`flask_continuum.partition.drop_partitions`.
+
+    Args:
+        model (type): Versioned model class.
+    """
+    if partition_period(model) is not None:
+        raise AssertionError(
+            'Versions for {} are partitioned. Drop old partitions '
+            'instead of compacting or vacuuming them.'.format(model.__name__))
+    return
+
+
+def expired(versions, policy, now):
+    """
+    Return transaction ids of versions that should be removed for
+    a single row, given ``(transaction_id, issued_at)`` pairs ordered
+    by transaction.
+
+    Args:
+        versions (list): Version transaction ids and issue times.
+        policy (dict): Retention policy for model.
+        now (datetime): Reference time for ``ttl`` policies.
+    """
+    removed = set()
+    candidates = versions[:-1]
+
+    keep_last = policy.get('keep_last')
+    if keep_last is not None:
+        removed.update(tx for tx, _ in versions[:len(versions) - max(keep_last, 1)])
+
+    ttl = policy.get('ttl')
+    if ttl is not None:
+        removed.update(tx for tx, issued in candidates if issued is not None and issued < now - ttl)
+
+    if policy.get('per_day'):
+        for (tx, issued), (_, following) in zip(versions, versions[1:]):
+            if issued is not None and following is not None and issued.date() == following.date():
+                removed.add(tx)
+
+    # latest version is always retained
+    removed.discard(versions[-1][0])
+    return removed
+
+
+def chunked(session, model, chunk_size=1000, after=None):
+    """
+    Iterate over parent keys present in version table for model,
+    in ordered chunks of at most ``chunk_size`` keys.
+
+    Args:
+        session (Session): Session to query with.
+        model (type): Versioned model class.
+        chunk_size (int): Number of keys per chunk.
+        after (tuple): Parent key to start after.
+    """
+    table = version_class(model).__table__
+    columns = [table.c[col.key] for col in inspect(model).primary_key]
+    key = columns[0] if len(columns) == 1 else tuple_(*columns)
+    while True:
+        query = session.query(*columns).select_from(version_class(model)).distinct().order_by(*columns)
+        if after is not None:
+            query = query.filter(key > (tuple_(*after) if len(columns) > 1 else after[0]))
+        idents = [tuple(row) for row in query.limit(chunk_size)]
+        if not idents:
+            return
+        yield idents
+        after = idents[-1]
+    return
+
+
+def histories(session, model, idents, *columns):
+    """
+    Return version data for parent keys as lists of tuples ordered
+    by transaction, keyed by parent key. Each tuple contains the
+    transaction id followed by requested column values.
+
+    Args:
+        session (Session): Session to query with.
+        model (type): Versioned model class.
+        idents (list): Parent keys to load versions for.
+        columns (list): Additional columns to load.
+    """
+    table = version_class(model).__table__
+    keys = [table.c[col.key] for col in inspect(model).primary_key]
+    tx_column = table.c[tx_column_name(model)]
+    criteria = keys[0].in_([x[0] for x in idents]) if len(keys) == 1 else \
+        tuple_(*keys).in_(idents)
+    query = session.query(*(keys + [tx_column] + list(columns))).select_from(version_class(model))
+    if any(col.table is not table for col in columns):
+        transaction = versioning_manager.transaction_cls
+        query = query.outerjoin(transaction, transaction.id == tx_column)
+    query = query.filter(criteria).order_by(*(keys + [tx_column]))
+
+    result = {}
+    for row in query:
+        result.setdefault(tuple(row[:len(keys)]), []).append(tuple(row[len(keys):]))
+    return result
+
+
+def expand(versions, keys):
+    """
+    Expand sparse version tuples ``(transaction_id, *values, changed)``
+    into ``(transaction_id, *values)`` tuples holding full row data,
+    with values ordered as in ``keys``.
+
+    Args:
+        versions (list): Ordered version tuples for a single row.
+        keys (list): Attribute keys for values in tuples.
+    """
+    state, result = {}, []
+    for row in versions:
+        stored = set(row[-1].split(',')) if row[-1] else set()
+        for key, value in zip(keys, row[1:-1]):
+            if key in stored:
+                state[key] = value
+        result.append((row[0],) + tuple(state.get(key) for key in keys))
+    return result
+
+
+def fold(session, model, removed):
+    """
+    Merge columns stored in sparse versions that are about to be
+    removed into the next retained version of each row, so that
+    reconstruction from the remaining versions yields the same data.
+
+    Args:
+        session (Session): Session to update versions with.
+        model (type): Versioned model class.
+        removed (dict): Transaction ids to delete, keyed by parent key.
+    """
+    table = version_class(model).__table__
+    mapper = inspect(version_class(model))
+    pks = [table.c[col.key] for col in inspect(model).primary_key]
+    tx_column = table.c[tx_column_name(model)]
+    names = [
+        (prop.key, mapper.get_property(prop.key).columns[0].key)
+        for prop in versioned_column_properties(model)
+    ]
+    keys = [key for key, _ in names]
+    columns = [table.c[name] for _, name in names] + [table.c[CHANGED]]
+
+    idents = [ident for ident, txs in removed.items() if txs]
+    if not idents:
+        return
+    for ident, versions in histories(session, model, idents, *columns).items():
+        pending = set()
+        full = expand(versions, keys)
+        for row, data in zip(versions, full):
+            stored = set(row[-1].split(',')) if row[-1] else set()
+            if row[0] in removed[ident]:
+                pending.update(stored)
+                continue
+            missing = pending - stored
+            pending = set()
+            if not missing:
+                continue
+            state = dict(zip(keys, data[1:]))
+            values = dict((name, state[key]) for key, name in names if key in missing)
+            values[CHANGED] = ','.join(sorted(stored | missing))
+            session.execute(table.update().where(and_(
+                tx_column == row[0],
+                *[col == value for col, value in zip(pks, ident)]
+            )).values(values), mapper=inspect(version_class(model)))
+    return
+
+
+def remove(session, model, removed):
+    """
+    Delete versions for parent keys and rebuild validity links
+    (``end_transaction_id``) for affected rows, returning the number
+    of deleted versions. Columns stored in removed sparse versions
+    are folded into the following version.
+
+    Args:
+        session (Session): Session to delete versions with.
+        model (type): Versioned model class.
+        removed (dict): Transaction ids to delete, keyed by parent key.
+    """
+    table = version_class(model).__table__
+    columns = [table.c[col.key] for col in inspect(model).primary_key]
+    tx_column = table.c[tx_column_name(model)]
+
+    params, touched = [], []
+    for ident, txs in removed.items():
+        if not txs:
+            continue
+        pk = dict(('pk_' + col.key, value) for col, value in zip(columns, ident))
+        params.extend(dict(pk, tx_=tx) for tx in sorted(txs))
+        touched.append(pk)
+    if not params:
+        return 0
+
+    invalidate_all(session)
+    if is_sparse(model):
+        fold(session, model, removed)
+    session.execute(table.delete().where(and_(
+        tx_column == bindparam('tx_'),
+        *[col == bindparam('pk_' + col.key) for col in columns]
+    )), params, mapper=inspect(version_class(model)))
+
+    if option(model, 'strategy') == 'validity':
+        alias = table.alias()
+        session.execute(table.update().where(and_(
+            *[col == bindparam('pk_' + col.key) for col in columns]
+        )).values({
+            end_tx_column_name(model): scalar_subquery(
+                select([func.min(alias.c[tx_column.key])])
+                .where(and_(
+                    alias.c[tx_column.key] > tx_column,
+                    *[alias.c[col.key] == col for col in columns]
+                )).correlate(table)
+            )
+        }), touched, mapper=inspect(version_class(model)))
+    return len(params)
+
+
+# compaction
+# ----------
+def compaction(session, model, policy=None, chunk_size=1000, after=None, now=None):
+    """
+    Apply retention policy to version table for model, processing
+    rows in chunks of ``chunk_size`` parent keys and committing after
+    each chunk. Validity links (``end_transaction_id``) are rebuilt
+    for every affected row, so that history navigation stays correct.
+
+    This is a generator yielding progress for each chunk, as a dictionary
+    with ``last`` (last processed key, usable as ``after`` to resume),
+    ``rows`` and ``deleted`` counts.
+
+    Args:
+        session (Session): Session to run compaction with.
+        model (type): Versioned model class.
+        policy (dict): Retention policy. Defaults to ``__retention__`` on model.
+        chunk_size (int): Number of parent rows processed per transaction.
+        after (tuple): Parent key to resume compaction after.
+        now (datetime): Reference time for ``ttl`` policies.
+    """
+    unpartitioned(model)
+    policy = retention_policy(model) if policy is None else policy
+    if not policy:
+        return
+    now = datetime.utcnow() if now is None else now
+    transaction = versioning_manager.transaction_cls
+
+    for idents in chunked(session, model, chunk_size=chunk_size, after=after):
+        data = histories(session, model, idents, transaction.issued_at)
+        deleted = remove(session, model, dict(
+            (ident, expired(versions, policy, now))
+            for ident, versions in data.items()
+        ))
+        session.commit()
+        yield dict(last=idents[-1], rows=len(idents), deleted=deleted)
+    return
+
+
+def compact(session, model, **kwargs):
+    """
+    Apply retention policy to version table for model, returning
+    the number of versions removed. See :func:`compaction` for
+    available arguments.
+    """
+    return sum(chunk['deleted'] for chunk in compaction(session, model, **kwargs))
+
+
+# vacuum
+# ------
+def vacuuming(session, model, chunk_size=1000, after=None):
+    """
+    Remove versions with no changes to versioned columns compared to
+    their previous version (deletions and re-insertions are kept),
+    streaming over the version table in chunks of ``chunk_size`` parent
+    keys and committing after each chunk. Unlike ``sqlalchemy_continuum.vacuum``,
+    only versioned column values are loaded, without building ORM objects.
+
+    This is a generator yielding progress for each chunk, in the same
+    format as :func:`compaction`.
+
+    Args:
+        session (Session): Session to run vacuum with.
+        model (type): Versioned model class.
+        chunk_size (int): Number of parent rows processed per transaction.
+        after (tuple): Parent key to resume vacuum after.
+    """
+    unpartitioned(model)
+    table = version_class(model).__table__
+    columns = [
+        table.c[inspect(version_class(model)).get_property(prop.key).columns[0].key]
+        for prop in versioned_column_properties(model)
+        if not prop.columns[0].primary_key
+    ] + [table.c[option(model, 'operation_type_column_name')]]
+    sparse = is_sparse(model)
+    if sparse:
+        keys = [
+            prop.key for prop in versioned_column_properties(model)
+            if not prop.columns[0].primary_key
+        ] + [None]
+        columns.append(table.c[CHANGED])
+
+    for idents in chunked(session, model, chunk_size=chunk_size, after=after):
+        removed = {}
+        for ident, versions in histories(session, model, idents, *columns).items():
+            if sparse:
+                ops = [row[-2] for row in versions]
+                versions = [
+                    data[:-1] + (op,)
+                    for data, op in zip(expand(versions, keys), ops)
+                ]
+            removed[ident] = set(
+                current[0] for previous, current in zip(versions, versions[1:])
+                if previous[1:-1] == current[1:-1] and
+                Operation.DELETE not in (previous[-1], current[-1])
+            )
+        deleted = remove(session, model, removed)
+        session.commit()
+        yield dict(last=idents[-1], rows=len(idents), deleted=deleted)
+    return
@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+#
+# Sparse version storage
+#
+# ------------------------------------------------
+
+
+# imports
+# -------
+from sqlalchemy import Column, Text, inspect
+from sqlalchemy.orm import object_session
+from sqlalchemy_continuum import Operation
+from sqlalchemy_continuum.plugins.base import Plugin
+from sqlalchemy_continuum.utils import versioned_column_properties
+from sqlalchemy_utils.functions import has_changes
+
+
+# config
+# ------
+CHANGED = 'changed_columns'
+
+
+# helpers
+# -------
+def is_sparse(model):
+    """
+    Return whether versions for model are stored sparsely, which is
+    enabled via the ``sparse`` key in ``__versioned__``:
+
+    .. code-block:: python
+
+        class Article(db.Model, VersioningMixin):
+            __versioned__ = {'sparse': True}
+
+    Args:
+        model (type): Versioned model class.
+    """
+    options = getattr(model, '__versioned__', None) or {}
+    return bool(options.get('sparse', False))
+
+
+def changed_columns(version):
+    """
+    Return set of attribute keys stored in sparse version object.
+    """
+    value = getattr(version, CHANGED, None)
+    return set(value.split(',')) if value else set()
+
+
+def reconstruct(versions, keys):
+    """
+    Iterate over full column data for ordered sparse versions of a
+    single row, yielding ``(data, changes)`` pairs where ``changes``
+    maps changed keys to ``[old, new]`` values.
+
+    Args:
+        versions (list): Ordered version objects, starting at the first
+            version of the row.
+        keys (list): Attribute keys to reconstruct.
+    """
+    state = {}
+    for version in versions:
+        stored = changed_columns(version)
+        changes = {}
+        for key in keys:
+            if key not in stored:
+                continue
+            value = getattr(version, key)
+            if state.get(key) != value:
+                changes[key] = [state.get(key), value]
+            state[key] = value
+        yield dict(state), changes
+    return
+
+
+def sparse_values(parent_obj, operation_type, values):
+    """
+    Return version values for parent object with columns that weren't
+    changed during the transaction cleared, and ``changed_columns`` set
+    to the stored attribute keys. The first version of a row stores all
+    columns.
+
+    Args:
+        parent_obj (object): Versioned object being flushed.
+        operation_type (int): Operation type for version.
+        values (dict): Version values keyed by attribute, including any
+            previously stored ``changed_columns`` for the transaction.
+    """
+    props = list(versioned_column_properties(parent_obj))
+    previous = values.get(CHANGED)
+    stored = set(previous.split(',')) if previous else set()
+    session = object_session(parent_obj)
+    if operation_type == Operation.INSERT or (previous is None and parent_obj in session.new):
+        stored.update(prop.key for prop in props)
+    elif operation_type != Operation.DELETE:
+        stored.update(prop.key for prop in props if has_changes(parent_obj, prop.key))
+
+    primary = set(
+        prop.key for prop in inspect(parent_obj.__class__).column_attrs
+        if prop.columns[0].primary_key
+    )
+    values = dict(values)
+    for prop in props:
+        if prop.key not in stored and prop.key not in primary:
+            values[prop.key] = None
+    values[CHANGED] = ','.join(sorted(stored | primary))
+    return values
+
+
+# plugin
+# ------
+class SparsePlugin(Plugin):
+    """
+    SQLAlchemy-Continuum plugin persisting only modified columns for
+    versions of models declaring ``'sparse': True`` in ``__versioned__``.
+    Sparse version tables get an additional ``changed_columns`` column
+    listing the attributes stored in each version; all other columns
+    are left ``NULL`` and reconstructed from previous versions on read.
+    """
+
+    def after_build_version_table_columns(self, table_builder, columns):
+        if table_builder.model is not None and is_sparse(table_builder.model):
+            columns.append(Column(CHANGED, Text, nullable=True))
+        return
+
+    def after_create_version_object(self, uow, parent_obj, version_obj):
+        if not is_sparse(parent_obj.__class__):
+            return
+
+        values = dict(
+            (prop.key, getattr(version_obj, prop.key))
+            for prop in versioned_column_properties(parent_obj)
+        )
+        values[CHANGED] = getattr(version_obj, CHANGED, None)
+        for key, value in sparse_values(parent_obj, version_obj.operation_type, values).items():
+            setattr(version_obj, key, value)
+        return
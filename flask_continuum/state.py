@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+#
+# Resolving extension state per application
+#
+# ------------------------------------------------
+
+
+# imports
+# -------
+from flask import current_app, has_app_context
+
+
+# helpers
+# -------
+def extension(session=None):
+    """
+    Return :class:`Continuum` extension of the application a session
+    belongs to, or of the current application. Flask-SQLAlchemy sessions
+    carry their application, while other sessions resolve it through
+    the application context. Returns ``None`` outside of applications
+    using the extension.
+
+    Args:
+        session (Session): Session to resolve application for.
+    """
+    app = getattr(session, 'app', None)
+    if app is None:
+        if not has_app_context():
+            return
+        app = current_app._get_current_object()
+    return app.extensions.get('continuum')
+
+
+def component(name, session=None):
+    """
+    Return feature configured on extension of the application a
+    session belongs to, such as ``stats``, ``cache``, ``replica``,
+    ``archive`` or ``writer``, or ``None`` if it isn't enabled.
+
+    Args:
+        name (str): Attribute of :class:`Continuum` holding feature.
+        session (Session): Session to resolve application for.
+    """
+    ext = extension(session)
+    if ext is None:
+        return
+    return getattr(ext, name, None)
@@ -0,0 +1,316 @@
+# -*- coding: utf-8 -*-
+#
+# Deferred version writing
+#
+# ------------------------------------------------
+
+
+# imports
+# -------
+import time
+import queue
+import logging
+import threading
+from datetime import datetime
+from collections import OrderedDict
+
+from sqlalchemy import and_, bindparam, event, inspect
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.exc import ObjectDeletedError
+from sqlalchemy_continuum import versioning_manager
+from sqlalchemy_continuum.utils import version_class, versioned_column_properties
+from sqlalchemy_utils import identity
+
+from .archive import ArchiveUnitOfWork
+from .sparse import CHANGED, is_sparse, sparse_values
+from .state import component
+
+
+# config
+# ------
+logger = logging.getLogger(__name__)
+
+PENDING = 'continuum.pending'
+FLUSH = object()
+STOP = object()
+
+
+# unit of work
+# ------------
+class DeferredUnitOfWork(ArchiveUnitOfWork):
+    """
+    SQLAlchemy-Continuum unit of work that captures version data in
+    memory at flush time instead of writing transaction and version
+    rows inside the flush, for sessions of applications with a
+    :class:`VersionWriter`. Captured data is stored on the session
+    until commit, where it is handed off to the writer. Sessions of
+    other applications write versions synchronously.
+
+    .. note:: SQLAlchemy-Continuum plugins are only consulted for
+              transaction arguments in this mode, and association
+              table versioning and ``__coalesce__`` windows are not
+              supported.
+    """
+
+    def process_before_flush(self, session):
+        if component('writer', session) is None:
+            return super(DeferredUnitOfWork, self).process_before_flush(session)
+        if not self.is_modified(session):
+            return
+
+        # transactions are issued at flush, not when they are written
+        pending = session.info.get(PENDING)
+        if pending is None:
+            session.info[PENDING] = dict(
+                transaction=dict(self.transaction_args(session), issued_at=datetime.utcnow()),
+                versions=OrderedDict(),
+            )
+        return
+
+    def process_after_flush(self, session):
+        if component('writer', session) is None:
+            return super(DeferredUnitOfWork, self).process_after_flush(session)
+        self.skip_paused(session)
+        pending = session.info.get(PENDING)
+        if pending is None:
+            return
+
+        for key, operation in self.operations.items():
+            if operation.processed:
+                continue
+            target = operation.target
+            version = version_class(target.__class__)
+            mapper = inspect(version)
+
+            # gather values for version columns
+            key = (version, identity(target))
+            values = {}
+            for prop in versioned_column_properties(target):
+                try:
+                    values[prop.key] = getattr(target, prop.key)
+                except ObjectDeletedError:
+                    values[prop.key] = None
+            if is_sparse(target.__class__):
+                previous = pending['versions'].get(key, {}).get(CHANGED)
+                values = sparse_values(target, operation.type, dict(values, **{CHANGED: previous}))
+
+            row = dict(
+                (mapper.get_property(name).columns[0].key if name != CHANGED else CHANGED, value)
+                for name, value in values.items()
+            )
+            row[self.manager.option(target, 'operation_type_column_name')] = operation.type
+            pending['versions'][key] = row
+            operation.processed = True
+        return
+
+
+# writer
+# ------
+class VersionWriter(object):
+    """
+    Background writer for version rows captured by :class:`DeferredUnitOfWork`,
+    created by :class:`Continuum` for applications using ``deferred=True``.
+    Each committed session transaction is queued in memory and written
+    by a worker thread in batches, with one transaction row per
+    committed transaction:
+
+    .. code-block:: python
+
+        continuum = Continuum(app, db, deferred=True, flush_interval=0.5)
+        ...
+        continuum.writer.drain()
+
+    Arguments:
+        engine (Engine): Engine to write version rows with.
+        queue_size (int): Maximum number of committed transactions held
+            in memory. Commits block when the queue is full.
+        flush_interval (float): Maximum number of seconds captured versions
+            wait in memory before being written.
+        batch_size (int): Maximum number of committed transactions
+            written per database transaction.
+        cache (HistoryCache): History cache to drop entries from once
+            versions for their rows are written.
+    """
+
+    def __init__(self, engine, queue_size=1000, flush_interval=1.0, batch_size=100, cache=None):
+        self.engine = engine
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.cache = cache
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.thread = None
+        self.lock = threading.Lock()
+        return
+
+    def put(self, pending):
+        """
+        Queue versions captured for a committed transaction.
+        """
+        self.start()
+        self.queue.put(pending)
+        return
+
+    def start(self):
+        """
+        Start worker thread if it isn't already running.
+        """
+        with self.lock:
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self.run, name='continuum-writer')
+                self.thread.daemon = True
+                self.thread.start()
+        return
+
+    def drain(self):
+        """
+        Block until all queued versions have been written.
+        """
+        if self.thread is not None and self.thread.is_alive():
+            self.queue.put(FLUSH)
+            self.queue.join()
+        return
+
+    def stop(self):
+        """
+        Write all queued versions and stop the worker thread. This
+        is registered as a shutdown hook by :class:`Continuum`.
+        """
+        if self.thread is not None and self.thread.is_alive():
+            self.queue.put(STOP)
+            self.thread.join()
+        self.thread = None
+        return
+
+    def run(self):
+        running = True
+        while running:
+            batch, received = [], 0
+            try:
+                entry = self.queue.get()
+                received += 1
+                deadline = time.time() + self.flush_interval
+                while entry is not FLUSH:
+                    if entry is STOP:
+                        running = False
+                        break
+                    batch.append(entry)
+                    if len(batch) >= self.batch_size:
+                        break
+                    entry = self.queue.get(timeout=max(deadline - time.time(), 0))
+                    received += 1
+            except queue.Empty:
+                pass
+
+            try:
+                if batch:
+                    self.write(batch)
+            except Exception:
+                logger.exception('Failed to write %d deferred versioning transactions.', len(batch))
+            finally:
+                for _ in range(received):
+                    self.queue.task_done()
+        return
+
+    def write(self, batch):
+        """
+        Write batch of captured transactions in a single database
+        transaction, using executemany for version rows.
+
+        Args:
+            batch (list): Captured transactions to write.
+        """
+        manager = versioning_manager
+        table = manager.transaction_cls.__table__
+        inserts, validity = OrderedDict(), OrderedDict()
+
+        with self.engine.begin() as conn:
+            for pending in batch:
+                result = conn.execute(table.insert(), pending['transaction'])
+                tx = result.inserted_primary_key[0]
+
+                for (version, ident), values in pending['versions'].items():
+                    model = manager.parent_class_map[version]
+                    row = dict(values)
+                    row[manager.option(model, 'transaction_column_name')] = tx
+                    inserts.setdefault(version, []).append(row)
+                    if manager.option(model, 'strategy') == 'validity':
+                        params = dict(
+                            ('pk_' + col.key, row[col.key])
+                            for col in inspect(model).primary_key
+                        )
+                        params['tx_'] = tx
+                        validity.setdefault(version, []).append(params)
+
+            for version, rows in inserts.items():
+                conn.execute(version.__table__.insert(), rows)
+
+            # close validity windows of previous versions, in transaction order
+            for version, rows in validity.items():
+                conn.execute(validity_update(version), rows)
+
+        # histories read before versions were written are stale
+        if self.cache is not None:
+            touched = OrderedDict()
+            for pending in batch:
+                for version, ident in pending['versions']:
+                    touched.setdefault(manager.parent_class_map[version], []).append(ident)
+            for model, idents in touched.items():
+                self.cache.invalidate(model, idents)
+        return
+
+
+# events
+# ------
+def committed(session):
+    pending = session.info.pop(PENDING, None)
+    if pending is None or not pending['versions']:
+        return
+    writer = component('writer', session)
+    if writer is not None:
+        writer.put(pending)
+    return
+
+
+def rolled_back(session):
+    session.info.pop(PENDING, None)
+    return
+
+
+EVENTS = (('after_commit', committed), ('after_rollback', rolled_back))
+
+
+# helpers
+# -------
+def install():
+    """
+    Hand off versions captured by :class:`DeferredUnitOfWork` to the
+    writer of the session's application on commit.
+    """
+    for name, listener in EVENTS:
+        if not event.contains(Session, name, listener):
+            event.listen(Session, name, listener)
+    return
+
+
+def validity_update(version):
+    """
+    Return statement closing the validity window of the latest
+    version preceding a new version.
+
+    Args:
+        version (type): Version model class.
+    """
+    manager = versioning_manager
+    model = manager.parent_class_map[version]
+    table = version.__table__
+    tx_col = table.c[manager.option(model, 'transaction_column_name')]
+    end_col = table.c[manager.option(model, 'end_transaction_column_name')]
+    criteria = [
+        table.c[col.key] == bindparam('pk_' + col.key)
+        for col in inspect(model).primary_key
+    ]
+    return table.update().where(and_(
+        tx_col < bindparam('tx_'),
+        end_col.is_(None),
+        *criteria
+    )).values({end_col.key: bindparam('tx_')})
@@ -56,7 +56,7 @@ setup(
     author=config.__author__,
     author_email=config.__email__,
     url=config.__url__,
-    packages=find_packages(exclude=['tests']),
+    packages=find_packages(exclude=['tests', 'benchmarks']),
     license="MIT",
     zip_safe=False,
     include_package_data=True,
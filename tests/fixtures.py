@@ -9,6 +9,9 @@
 # -------
 import pytest
 import factory
+from contextlib import contextmanager
+from sqlalchemy import event
+from sqlalchemy.orm.mapper import Mapper
 from flask import Flask, request, jsonify
 from werkzeug.exceptions import NotFound
 from flask_sqlalchemy import SQLAlchemy
@@ -25,6 +28,7 @@ class Config(object):
     SQLALCHEMY_ECHO = False
     PROPAGATE_EXCEPTIONS = False
     SQLALCHEMY_DATABASE_URI = 'sqlite:///{}/app.db'.format(SANDBOX)
+    SQLALCHEMY_BINDS = {'archive': 'sqlite:///{}/archive.db'.format(SANDBOX)}
     PLUGIN_DEFAULT_VARIABLE = True
 
 
@@ -85,6 +89,31 @@ class Item(db.Model, VersioningMixin):
         return dict(id=self.id, name=self.name)
 
 
+class Document(db.Model, VersioningMixin):
+    __tablename__ = 'document'
+    __versioned__ = {'sparse': True}
+
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(255), nullable=False)
+    content = db.Column(db.Text)
+
+
+class Note(db.Model, VersioningMixin):
+    __tablename__ = 'note'
+    __coalesce__ = 60
+
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(255), nullable=False)
+
+
+class Log(db.Model, VersioningMixin):
+    __tablename__ = 'log'
+    __versioned__ = {'partition': 'month'}
+
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(255), nullable=False)
+
+
 # factories
 # ---------
 class ItemFactory(factory.alchemy.SQLAlchemyModelFactory):
@@ -98,6 +127,70 @@ class ItemFactory(factory.alchemy.SQLAlchemyModelFactory):
         sqlalchemy_session_persistence = 'commit'
 
 
+class DocumentFactory(factory.alchemy.SQLAlchemyModelFactory):
+
+    id = factory.Sequence(lambda x: x + 100)
+    name = factory.Faker('name')
+    content = factory.Faker('text')
+
+    class Meta:
+        model = Document
+        sqlalchemy_session = db.session
+        sqlalchemy_session_persistence = 'commit'
+
+
+# helpers
+# -------
+@contextmanager
+def statements():
+    """
+    Collect SQL statements issued against the application
+    database within the managed block.
+    """
+    issued = []
+
+    def track(conn, cursor, statement, parameters, context, executemany):
+        issued.append(statement)
+        return
+
+    engine = db.engine
+    event.listen(engine, 'before_cursor_execute', track)
+    try:
+        yield issued
+    finally:
+        event.remove(engine, 'before_cursor_execute', track)
+    return
+
+
+@contextmanager
+def configured(**options):
+    """
+    Run managed block in a separate application using the shared
+    database and models, with an extension configured by options.
+    """
+    other = Flask(__name__)
+    other.config.from_object(Config)
+    db.init_app(other)
+    ext = Continuum(other, db, **options)
+
+    # scoped sessions belong to the application they were created in
+    db.session.remove()
+    try:
+        with other.app_context():
+            yield ext
+            db.session.remove()
+    finally:
+        event.remove(Mapper, 'after_configured', ext.setup)
+        if ext.writer is not None:
+            ext.writer.stop()
+        if ext.archive is not None:
+            ext.archive.unbind_tables()
+        db.session.remove()
+        for connector in other.extensions['sqlalchemy'].connectors.values():
+            connector.get_engine().dispose()
+    return
+
+
 # fixtures
 # --------
 @pytest.fixture(scope='session')
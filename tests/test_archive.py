@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+#
+# Testing for history archive database
+#
+# ------------------------------------------------
+
+
+# imports
+# -------
+import io
+import pytest
+from sqlalchemy import func, inspect, select
+from sqlalchemy.orm import configure_mappers
+from sqlalchemy_continuum import version_class, versioning_manager
+
+from flask_continuum.export import export_history
+
+from .fixtures import db, configured, Item, ItemFactory
+
+
+# fixtures
+# --------
+@pytest.fixture
+def archive(client):
+    with configured(archive='archive') as ext:
+        db.drop_all(bind='archive')
+        configure_mappers()
+        db.create_all()
+        yield ext
+    return
+
+
+def count(bind, model, ident):
+    table = version_class(model).__table__
+    return db.get_engine(bind=bind).execute(
+        select([func.count()]).select_from(table).where(table.c.id == ident)
+    ).scalar()
+
+
+# session
+# -------
+class TestArchive(object):
+
+    def test_tables(self, client, archive):
+        tables = inspect(db.get_engine(bind='archive')).get_table_names()
+        assert 'transaction' in tables
+        assert version_class(Item).__table__.name in tables
+        assert Item.__table__.name not in tables
+        return
+
+    def test_versions(self, client, archive):
+        item = ItemFactory.create(name='archive 1')
+        item.name = 'archive 2'
+        db.session.commit()
+
+        # history is only stored in archive database
+        assert count(None, Item, item.id) == 0
+        assert count('archive', Item, item.id) == 2
+        transactions = versioning_manager.transaction_cls.__table__
+        assert db.get_engine(bind='archive').execute(
+            select([func.count()]).select_from(transactions)
+        ).scalar() >= 2
+
+        # and queryable through the mixin
+        item = db.session.query(Item).filter_by(id=item.id).one()
+        assert item.modified
+        assert [x.name for x in item.records] == ['archive 1', 'archive 2']
+        tx = item.records[0].transaction_id
+        assert Item.as_of(transaction_id=tx).filter_by(id=item.id).one().name == 'archive 1'
+        stream = io.StringIO()
+        export_history(db.session, [Item], stream)
+        assert 'archive 2' in stream.getvalue()
+
+        # reverts write parent rows to the primary database
+        item.records[0].revert()
+        db.session.commit()
+        assert db.session.query(Item).filter_by(id=item.id).one().name == 'archive 1'
+        assert count('archive', Item, item.id) == 3
+        return
+
+    def test_rollback(self, client, archive):
+        item = ItemFactory.create(name='archive rollback 1')
+
+        # archived versions commit and roll back with the session
+        item.name = 'archive rollback 2'
+        db.session.flush()
+        db.session.rollback()
+        assert count('archive', Item, item.id) == 1
+        return
+
+    def test_set_based(self, client, archive):
+        item = ItemFactory.create(name='archive set 1')
+        with pytest.raises(AssertionError):
+            archive.revert_to(Item, item.records[0].transaction_id)
+        db.session.rollback()
+        return
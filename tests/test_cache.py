@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+#
+# Testing for history read cache
+#
+# ------------------------------------------------
+
+
+# imports
+# -------
+import os
+import pytest
+
+from flask_continuum.cache import FileSystemCache, HistoryCache, MemoryCache
+
+from . import SANDBOX
+from .fixtures import db, configured, statements, DocumentFactory, ItemFactory
+
+
+# fixtures
+# --------
+@pytest.fixture
+def memory(client):
+    with configured(cache=MemoryCache()) as ext:
+        yield ext.cache
+    return
+
+
+# session
+# -------
+class TestCache(object):
+
+    def test_records(self, client, memory):
+        item = ItemFactory.create(name='cache 1')
+        item.name = 'cache 2'
+        db.session.commit()
+
+        # first read stores history
+        assert [x.name for x in item.records] == ['cache 1', 'cache 2']
+
+        # second read skips database
+        with statements() as issued:
+            records = item.records
+        assert issued == []
+        assert [x.name for x in records] == ['cache 1', 'cache 2']
+        assert records[0].transaction_id < records[1].transaction_id
+
+        # version objects are loaded lazily
+        assert records[1].previous.name == 'cache 1'
+        assert records[1].changeset['name'] == ['cache 1', 'cache 2']
+
+        # commits invalidate entries
+        item.name = 'cache 3'
+        db.session.commit()
+        assert [x.name for x in item.records] == ['cache 1', 'cache 2', 'cache 3']
+        return
+
+    def test_uncommitted(self, client, memory):
+        item = ItemFactory.create(name='cache uncommitted 1')
+        item.name = 'cache uncommitted 2'
+        db.session.flush()
+        assert len(item.records) == 2
+
+        # pending histories aren't stored
+        db.session.rollback()
+        assert [x.name for x in item.records] == ['cache uncommitted 1']
+        return
+
+    def test_read_your_writes(self, client, memory):
+        item = ItemFactory.create(name='cache writes 1')
+        assert [x.name for x in item.records] == ['cache writes 1']
+
+        # cached histories aren't used for rows with flushed changes
+        item.name = 'cache writes 2'
+        db.session.flush()
+        assert [x.name for x in item.records] == ['cache writes 1', 'cache writes 2']
+        db.session.rollback()
+        assert [x.name for x in item.records] == ['cache writes 1']
+        return
+
+    def test_sparse(self, client, memory):
+        doc = DocumentFactory.create(name='cache sparse', content='one')
+        doc.content = 'two'
+        db.session.commit()
+        assert [x.content for x in doc.records] == ['one', 'two']
+
+        with statements() as issued:
+            records = doc.records
+        assert issued == []
+        assert [(x.name, x.content) for x in records] == [('cache sparse', 'one'), ('cache sparse', 'two')]
+        assert records[1].changeset == dict(content=['one', 'two'])
+        return
+
+    def test_filesystem(self, client):
+        cache = HistoryCache(FileSystemCache(os.path.join(SANDBOX, 'cache')), validate=True)
+        with configured(cache=cache) as ext:
+            item = ItemFactory.create(name='cache file 1')
+            assert [x.name for x in item.records] == ['cache file 1']
+
+            # validated hits issue a single query
+            with statements() as issued:
+                records = item.records
+            assert len(issued) == 1
+            assert [x.name for x in records] == ['cache file 1']
+
+            # changes made outside of cache invalidate validated entries
+            ext.cache = None
+            item.name = 'cache file 2'
+            db.session.commit()
+            ext.cache = cache
+            assert [x.name for x in item.records] == ['cache file 1', 'cache file 2']
+            cache.clear()
+        return
@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+#
+# Testing for command-line tools
+#
+# ------------------------------------------------
+
+
+# imports
+# -------
+import os
+import json
+import pytest
+
+from . import SANDBOX
+from .fixtures import app, db, Item, ItemFactory
+
+
+# fixtures
+# --------
+@pytest.fixture
+def runner(client):
+    return app.test_cli_runner()
+
+
+# helpers
+# -------
+def create(name, updates):
+    item = ItemFactory.create(name='{} 0'.format(name))
+    for idx in range(1, updates + 1):
+        item.name = '{} {}'.format(name, idx)
+        db.session.commit()
+    return item.id
+
+
+# session
+# -------
+class TestCLI(object):
+
+    def test_stats(self, runner):
+        create('cli stats', 1)
+        result = runner.invoke(args=['continuum', 'stats', 'Item'])
+        assert result.exit_code == 0
+        assert result.output.startswith('Item: ')
+        assert 'versions for' in result.output
+
+        result = runner.invoke(args=['continuum', 'stats', 'missing'])
+        assert result.exit_code != 0
+        return
+
+    def test_prune(self, runner):
+        ident = create('cli prune', 3)
+        path = os.path.join(SANDBOX, 'prune.json')
+        result = runner.invoke(args=[
+            'continuum', 'prune', 'item',
+            '--keep-last', '1', '--chunk-size', '2', '--checkpoint', path,
+        ])
+        assert result.exit_code == 0
+        assert 'rows processed' in result.output
+        assert 'Item: done' in result.output
+
+        item = db.session.query(Item).filter_by(id=ident).one()
+        assert [x.name for x in item.records] == ['cli prune 3']
+
+        # checkpoint is cleared on completion
+        with open(path) as fi:
+            assert json.load(fi) == {}
+
+        # models without policies are skipped
+        result = runner.invoke(args=['continuum', 'prune', 'Item'])
+        assert 'no retention policy' in result.output
+
+        # and so are partitioned models
+        result = runner.invoke(args=['continuum', 'prune', 'Log', '--keep-last', '1'])
+        assert result.exit_code == 0
+        assert 'Log: partitioned versions, skipping' in result.output
+        return
+
+    def test_vacuum_resume(self, runner):
+        ident = create('cli vacuum', 2)
+
+        # make middle version identical to the first one
+        item = db.session.query(Item).filter_by(id=ident).one()
+        version = item.versions[1]
+        db.session.execute(
+            'UPDATE item_version SET name = :name WHERE id = :id AND transaction_id = :tx',
+            dict(name='cli vacuum 0', id=ident, tx=version.transaction_id)
+        )
+        db.session.commit()
+
+        # resume from checkpoint just before item
+        path = os.path.join(SANDBOX, 'vacuum.json')
+        with open(path, 'w') as fo:
+            json.dump(dict(Item=[ident - 1]), fo)
+        result = runner.invoke(args=['continuum', 'vacuum', 'Item', '--checkpoint', path])
+        assert result.exit_code == 0
+        assert 'Item: done (1 versions removed)' in result.output
+
+        db.session.expire_all()
+        item = db.session.query(Item).filter_by(id=ident).one()
+        assert [x.name for x in item.records] == ['cli vacuum 0', 'cli vacuum 2']
+        assert item.records[1].previous.name == 'cli vacuum 0'
+        return
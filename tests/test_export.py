@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+#
+# Testing for history export
+#
+# ------------------------------------------------
+
+
+# imports
+# -------
+import io
+import os
+import csv
+import gzip
+import json
+import pytest
+from sqlalchemy_continuum import transaction_class, version_class
+from flask_continuum.export import export_history, import_history
+
+from . import SANDBOX
+from .fixtures import app, db, Item, ItemFactory
+
+
+# helpers
+# -------
+def snapshot():
+    ItemVersion = version_class(Item)
+    return [
+        (x.id, x.name, x.transaction_id, x.end_transaction_id, x.operation_type, x.transaction.issued_at)
+        for x in db.session.query(ItemVersion).order_by(ItemVersion.transaction_id, ItemVersion.id)
+    ]
+
+
+def clear():
+    db.session.query(version_class(Item)).delete()
+    db.session.query(transaction_class(Item)).delete()
+    db.session.commit()
+    return
+
+
+# session
+# -------
+class TestExport(object):
+
+    def test_jsonl_roundtrip(self, client):
+        item = ItemFactory.create(name='export 1')
+        item.name = 'export 2'
+        db.session.commit()
+        before = snapshot()
+
+        # export compressed json lines
+        path = os.path.join(SANDBOX, 'history.jsonl.gz')
+        assert export_history(db.session, [Item], path, yield_per=2) == len(before)
+        with gzip.open(path, 'rt') as fi:
+            rows = [json.loads(line) for line in fi]
+        assert len(rows) == len(before)
+        assert rows[0]['__model__'] == 'Item'
+        assert 'transaction.issued_at' in rows[0]
+
+        # restore into empty tables
+        clear()
+        assert import_history(db.session, path, batch_size=3) == len(before)
+        db.session.expire_all()
+        assert snapshot() == before
+        return
+
+    def test_csv_roundtrip(self, client):
+        ItemFactory.create(name='export csv')
+        before = snapshot()
+
+        stream = io.StringIO()
+        assert export_history(db.session, [Item], stream, format='csv') == len(before)
+        rows = list(csv.DictReader(io.StringIO(stream.getvalue())))
+        assert rows[-1]['name'] == 'export csv'
+        assert rows[-1]['end_transaction_id'] == '\\N'
+
+        # nulls stay apart from empty strings
+        transaction = transaction_class(Item)
+        tx = db.session.query(transaction).get(int(rows[-1]['transaction_id']))
+        assert tx.remote_addr is None
+
+        clear()
+        stream.seek(0)
+        assert import_history(db.session, stream, format='csv', model=Item) == len(before)
+        db.session.expire_all()
+        assert snapshot() == before
+        assert db.session.query(transaction).get(int(rows[-1]['transaction_id'])).remote_addr is None
+
+        with pytest.raises(AssertionError):
+            export_history(db.session, [Item, Item], stream, format='csv')
+        return
+
+    def test_cli(self, client):
+        ItemFactory.create(name='export cli')
+        runner = app.test_cli_runner()
+        path = os.path.join(SANDBOX, 'history.csv')
+        result = runner.invoke(args=['continuum', 'export', 'Item', '-o', path, '--format', 'csv'])
+        assert result.exit_code == 0
+        assert result.output.startswith('Exported')
+
+        before = snapshot()
+        clear()
+        result = runner.invoke(args=['continuum', 'import', path, '--format', 'csv', '--model', 'Item'])
+        assert result.exit_code == 0
+        db.session.expire_all()
+        assert snapshot() == before
+        return
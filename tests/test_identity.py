@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+#
+# Testing for current user resolution
+#
+# ------------------------------------------------
+
+
+# imports
+# -------
+from flask import g
+
+from flask_continuum.identity import UserResolver, g_user_id, header_user_id, login_user_id
+
+from .fixtures import app, continuum
+
+
+# session
+# -------
+class TestIdentity(object):
+
+    def test_chain(self, client):
+        resolver = UserResolver(g_user_id('user'), header_user_id('X-User'), login_user_id)
+        assert resolver() is None
+
+        # header used when nothing is set on g
+        with app.test_request_context(headers={'X-User': '7'}):
+            assert resolver() == '7'
+
+        # earlier resolvers take precedence
+        with app.test_request_context(headers={'X-User': '7'}):
+            g.user = 3
+            assert resolver() == 3
+        return
+
+    def test_cache(self, client):
+        calls = []
+
+        def lookup():
+            calls.append(1)
+            return len(calls)
+
+        resolver = UserResolver(lookup)
+        with app.test_request_context():
+            assert [resolver(), resolver(), resolver()] == [1, 1, 1]
+            resolver.reset()
+            assert resolver() == 2
+        with app.test_request_context():
+            assert resolver() == 3
+        assert len(calls) == 3
+        return
+
+    def test_plugin(self, client):
+        assert isinstance(continuum.current_user, UserResolver)
+        with app.test_request_context():
+            assert continuum.current_user() is None
+        return
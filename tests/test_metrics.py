@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+#
+# Testing for versioning metrics
+#
+# ------------------------------------------------
+
+
+# imports
+# -------
+import pytest
+from flask import current_app
+from flask_continuum import metrics
+from flask_continuum.metrics import history_read, versions_flushed
+
+from .fixtures import app, db, configured, ItemFactory, Item
+
+
+# fixtures
+# --------
+@pytest.fixture
+def continuum(client):
+    with configured(metrics=True) as ext:
+        yield ext
+    return
+
+
+# session
+# -------
+class TestMetrics(object):
+
+    def test_flush(self, continuum):
+        assert current_app.extensions['continuum'].stats is continuum.stats
+        assert app.extensions['continuum'].stats is None
+        continuum.stats.reset()
+
+        flushed = []
+        def receive(sender, **kwargs):
+            flushed.append(kwargs)
+            return
+
+        with versions_flushed.connected_to(receive, continuum.app):
+            item = ItemFactory.create(name='metrics 1')
+            item.name = 'metrics 2'
+            db.session.commit()
+
+        stats = continuum.stats.as_dict()
+        assert stats['flushes'] == 2
+        assert stats['versions'] == dict(Item=2)
+        assert stats['transactions'] == 2
+        assert stats['version_time'] > 0 and stats['transaction_time'] > 0
+        assert [x['versions'] for x in flushed] == [dict(Item=1), dict(Item=1)]
+        return
+
+    def test_reads(self, continuum):
+        item = ItemFactory.create(name='metrics read 1')
+        item.name = 'metrics read 2'
+        db.session.commit()
+        item = db.session.query(Item).filter_by(id=item.id).one()
+        continuum.stats.reset()
+
+        read = []
+        def receive(sender, **kwargs):
+            read.append(kwargs)
+            return
+
+        with history_read.connected_to(receive, continuum.app):
+            assert len(item.records) == 2
+            assert item.modified
+            assert item.modified
+
+        reads = continuum.stats.as_dict()['reads']
+        assert reads['records']['count'] == 1
+        assert reads['records']['queries'] == 1
+        assert reads['modified'] == dict(count=2, queries=1, time=reads['modified']['time'])
+        assert [x['name'] for x in read] == ['records', 'modified', 'modified']
+        return
+
+    def test_disabled(self, client, monkeypatch):
+        assert app.extensions['continuum'].stats is None
+
+        received = []
+        def receive(sender, **kwargs):
+            received.append(kwargs)
+            return
+
+        def fail(*args, **kwargs):
+            raise AssertionError('Stats used with metrics disabled.')
+
+        # disabled metrics skip stats entirely
+        for name in ['read', 'record_flush', 'record_transaction', 'count']:
+            monkeypatch.setattr(metrics.Stats, name, fail)
+        read = metrics.measured('test')(lambda x: x + 1)
+        assert read(1) == 2
+        with versions_flushed.connected_to(receive), history_read.connected_to(receive):
+            item = ItemFactory.create(name='metrics disabled 1')
+            item.name = 'metrics disabled 2'
+            db.session.commit()
+            assert len(item.records) == 2
+            assert item.modified
+        assert received == []
+        return
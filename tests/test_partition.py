@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+#
+# Testing for time-partitioned version storage
+#
+# ------------------------------------------------
+
+
+# imports
+# -------
+import pytest
+from datetime import datetime
+from sqlalchemy import func, select
+from sqlalchemy_continuum import version_class, versioning_manager
+
+from flask_continuum.partition import partition_period
+from flask_continuum.retention import vacuuming
+
+from .fixtures import db, continuum, statements, Item, Log
+
+
+# helpers
+# -------
+def backdate(transaction_id, issued_at):
+    transaction = versioning_manager.transaction_cls.__table__
+    db.session.execute(
+        transaction.update().where(transaction.c.id == transaction_id).values(issued_at=issued_at)
+    )
+    return
+
+
+# session
+# -------
+class TestPartition(object):
+
+    def test_partitions(self, client):
+        log = Log(name='log 0')
+        db.session.add(log)
+        db.session.commit()
+        for idx in range(1, 4):
+            log.name = 'log {}'.format(idx)
+            db.session.commit()
+        txs = [x.transaction_id for x in log.records]
+        for tx, issued_at in zip(txs, [
+            datetime(2001, 1, 5), datetime(2001, 1, 20),
+            datetime(2001, 2, 5), datetime(2001, 3, 5),
+        ]):
+            backdate(tx, issued_at)
+        db.session.commit()
+
+        # closed versions move to buckets per period
+        moved = continuum.rotate(before=datetime(2001, 3, 1))
+        db.session.commit()
+        assert moved == {Log: {'log_version_200101': 2, 'log_version_200102': 1}}
+        LogVersion = version_class(Log)
+        assert [x.name for x in db.session.query(LogVersion).filter_by(id=log.id)] == ['log 3']
+        assert continuum.rotate(before=datetime(2001, 3, 1)) == {Log: {}}
+
+        # reads span buckets
+        log = db.session.query(Log).filter_by(id=log.id).one()
+        assert log.modified
+        records = log.records
+        assert [x.name for x in records] == ['log 0', 'log 1', 'log 2', 'log 3']
+        assert records[2].previous.name == 'log 1'
+        assert records[1].next.name == 'log 2'
+        assert records[2].index == 2
+        assert [x.name for x in log.history.page(after=txs[1])] == ['log 2', 'log 3']
+        assert [x.name for x in Log.history_for([log])[log.id]] == [x.name for x in records]
+
+        # and only touch buckets they need
+        with statements() as issued:
+            assert Log.as_of(transaction_id=txs[1]).filter_by(id=log.id).one().name == 'log 1'
+        assert any('log_version_200101' in x for x in issued)
+        assert not any('log_version_200102' in x for x in issued)
+        assert Log.as_of(timestamp=datetime(2001, 2, 10)).filter_by(id=log.id).one().name == 'log 2'
+
+        # old buckets are dropped as a whole
+        assert continuum.drop_partitions(Log, before=datetime(2001, 2, 1)) == ['log_version_200101']
+        db.session.commit()
+        log = db.session.query(Log).filter_by(id=log.id).one()
+        assert [x.name for x in log.records] == ['log 2', 'log 3']
+        return
+
+    def test_options(self, client):
+        assert partition_period(Log) == 'month'
+        assert partition_period(Item) is None
+        with pytest.raises(AssertionError):
+            continuum.rotate(models=[Item])
+
+        # retention doesn't cover buckets
+        with pytest.raises(AssertionError):
+            continuum.compact(models=[Log], policy=dict(keep_last=1))
+        with pytest.raises(AssertionError):
+            list(vacuuming(db.session, Log))
+        return
@@ -7,7 +7,18 @@
 
 # imports
 # -------
-from .fixtures import db, Item, ItemFactory
+import sys
+import pytest
+from datetime import datetime, timedelta
+from flask import Flask
+from sqlalchemy import event
+from sqlalchemy.orm.exc import UnmappedInstanceError
+from sqlalchemy.orm.mapper import Mapper
+from sqlalchemy_continuum import Operation, version_class, versioning_manager
+from flask_continuum import Continuum, bulk
+from flask_continuum.mixins import RECORDS
+
+from .fixtures import db, continuum, Config, Document, DocumentFactory, Item, ItemFactory, Note, statements
 
 
 # session
@@ -66,3 +77,375 @@ class TestVersioning(object):
         assert response.status_code == 200
         assert response.json['name'] == 'revert 1'
         return
+
+    def test_records_query_count(self, client):
+        counts = []
+        for depth in [2, 10]:
+            item = ItemFactory.create(name='depth {}'.format(depth))
+            for idx in range(1, depth):
+                item.name = 'depth {} {}'.format(depth, idx)
+                db.session.commit()
+
+            # make sure object state is loaded before counting
+            item = db.session.query(Item).filter_by(id=item.id).one()
+            with statements() as issued:
+                records = item.records
+            assert len(records) == depth
+            assert records[-1].name == item.name
+            counts.append(len(issued))
+
+        assert counts[0] == counts[1] == 1
+        return
+
+    def test_record_class_cache(self, client, items):
+        cls = Item.record_class()
+        assert RECORDS[Item] is cls
+        assert Item.record_class() is cls
+        assert cls.__columns__ == ('id', 'name')
+
+        # records share the cached proxy type
+        item = db.session.query(Item).filter_by(id=items[0].id).one()
+        assert type(item.records[0]) is cls
+        assert type(item.records[0]) is type(item.records[0])
+        return
+
+    def test_record_objects(self, client):
+        item = ItemFactory.create(name='record 1')
+        item.name = 'record 2'
+        db.session.commit()
+        record = item.records[0]
+
+        # records carry column values only
+        assert not hasattr(record, '__dict__')
+        assert Item not in type(record).__mro__
+        assert record.json() == dict(id=item.id, name='record 1')
+        assert record.next.name == 'record 2'
+
+        # errors within record properties aren't masked
+        orphan = type(record)(dict(id=item.id, name='record 1'))
+        with pytest.raises(AttributeError) as exc:
+            orphan.next
+        assert 'NoneType' in str(exc.value)
+
+        # records are read-only and detached from sessions
+        with pytest.raises(AttributeError):
+            record.name = 'record 3'
+        with pytest.raises(UnmappedInstanceError):
+            db.session.add(record)
+        return
+
+    def test_history(self, client):
+        item = ItemFactory.create(name='history 0')
+        for idx in range(1, 7):
+            item.name = 'history {}'.format(idx)
+            db.session.commit()
+        item = db.session.query(Item).filter_by(id=item.id).one()
+        history = item.history
+
+        # length and indexing
+        assert len(history) == 7
+        assert history[0].name == 'history 0'
+        assert history[-1].name == 'history 6'
+
+        # slicing pushes limits down to sql
+        with statements() as issued:
+            latest = history[-3:]
+        assert [x.name for x in latest] == ['history 4', 'history 5', 'history 6']
+        assert len(issued) == 1 and 'LIMIT' in issued[0]
+        assert [x.name for x in history[1:3]] == ['history 1', 'history 2']
+        assert [x.name for x in history[-3:-1]] == ['history 4', 'history 5']
+        assert [x.name for x in history[2:-3]] == ['history 2', 'history 3']
+
+        # iteration in pages
+        history.per_page = 3
+        assert [x.name for x in history] == ['history {}'.format(x) for x in range(7)]
+        assert [x.name for x in reversed(history)] == ['history {}'.format(x) for x in reversed(range(7))]
+
+        # keyset pagination
+        page = history.page(limit=4)
+        assert [x.name for x in page] == ['history {}'.format(x) for x in range(4)]
+        page = history.page(after=page[-1].transaction_id, limit=4)
+        assert [x.name for x in page] == ['history {}'.format(x) for x in range(4, 7)]
+        page = history.page(before=page[0].transaction_id, limit=2)
+        assert [x.name for x in page] == ['history 2', 'history 3']
+        return
+
+    def test_changesets(self, client):
+        item = ItemFactory.create(name='changesets 0')
+        for idx in range(1, 4):
+            item.name = 'changesets {}'.format(idx)
+            db.session.commit()
+        item = db.session.query(Item).filter_by(id=item.id).one()
+
+        # all diffs are computed from one query
+        with statements() as issued:
+            changes = item.changesets()
+        assert len(issued) == 1
+        assert list(changes.values()) == [x.changeset for x in item.records]
+        assert list(changes.keys()) == [x.transaction_id for x in item.records]
+
+        # restricted to column subset
+        changes = list(item.changesets(columns=['id']).values())
+        assert changes[0] == dict(id=[None, item.id])
+        assert changes[1:] == [{}, {}, {}]
+        return
+
+    def test_modified(self, client):
+        item = ItemFactory.create(name='modified 1')
+        item = db.session.query(Item).filter_by(id=item.id).one()
+
+        # exists query, memoized on instance
+        with statements() as issued:
+            assert item.modified
+            assert item.modified
+        assert len(issued) == 1
+        assert 'EXISTS' in issued[0]
+        assert 'count' not in issued[0].lower()
+
+        # flushing a change invalidates memoized value
+        item.name = 'modified 2'
+        db.session.flush()
+        with statements() as issued:
+            assert item.modified
+        assert len(issued) == 1
+        db.session.commit()
+
+        # transient objects have no history
+        assert not Item(name='modified 3').modified
+        return
+
+    def test_history_for(self, client):
+        items = [ItemFactory.create(name='bulk {}'.format(x)) for x in range(3)]
+        items[0].name = 'bulk 0 updated'
+        db.session.commit()
+        items = db.session.query(Item).filter(Item.id.in_([x.id for x in items])).all()
+
+        # single query for all objects
+        with statements() as issued:
+            history = Item.history_for(items)
+        assert len(issued) == 1
+        assert list(history.keys()) == [x.id for x in items]
+        assert [x.name for x in history[items[0].id]] == ['bulk 0', 'bulk 0 updated']
+        assert [x.name for x in history[items[1].id]] == ['bulk 1']
+        assert type(history[items[1].id][0]) is Item.record_class()
+
+        # primary keys work too
+        history = Item.history_for([items[2].id, -1])
+        assert [x.name for x in history[items[2].id]] == ['bulk 2']
+        assert history[-1] == []
+        return
+
+    def test_configure_once(self, client, monkeypatch):
+        assert continuum.timings['configure'] is not None
+        assert continuum.timings['connect'] >= continuum.timings['configure']
+
+        # new connections don't reconfigure mappers
+        calls = []
+        monkeypatch.setattr(continuum, 'configure', lambda: calls.append(True))
+        for idx in range(3):
+            with db.engine.connect() as conn:
+                conn.execute('SELECT 1')
+        assert calls == []
+        return
+
+    def test_connected_before_init(self, client):
+        other = Flask(__name__)
+        other.config.from_object(Config)
+        db.init_app(other)
+        engine = db.get_engine(other)
+        with engine.connect() as conn:
+            conn.execute('SELECT 1')
+
+        # setup doesn't wait for a first connection
+        ext = Continuum(other, db, archive='archive')
+        try:
+            assert ext.timings['connect'] is None
+            assert version_class(Item).__table__.info['bind_key'] == 'archive'
+        finally:
+            event.remove(Mapper, 'after_configured', ext.setup)
+            ext.archive.unbind_tables()
+            engine.dispose()
+        return
+
+    def test_bulk_insert(self, client):
+        rows = [dict(id=5000 + x, name='bulk insert {}'.format(x)) for x in range(5)]
+        with statements() as issued:
+            assert continuum.bulk_insert(Item, rows, batch_size=2) == 5
+        db.session.commit()
+
+        # one transaction row and two executemany inserts per batch
+        assert len([x for x in issued if 'INSERT INTO "transaction"' in x or 'INSERT INTO transaction' in x]) == 3
+        assert len(issued) == 9
+
+        item = db.session.query(Item).filter_by(id=5003).one()
+        assert item.name == 'bulk insert 3'
+        assert [x.name for x in item.records] == ['bulk insert 3']
+        assert item.versions[0].transaction_id == db.session.query(Item).filter_by(id=5002).one().versions[0].transaction_id
+
+        # generated primary keys
+        continuum.bulk_insert(Item, [dict(name='bulk insert auto')])
+        db.session.commit()
+        item = db.session.query(Item).filter_by(name='bulk insert auto').one()
+        assert item.modified
+        return
+
+    def test_revert_transaction(self, client):
+        a = ItemFactory.create(id=6000, name='revert a')
+        b = ItemFactory.create(id=6001, name='revert b')
+
+        # bad batch touching several rows
+        a.name = 'revert a bad'
+        db.session.delete(b)
+        db.session.add(Item(id=6002, name='revert c bad'))
+        db.session.commit()
+        bad = db.session.query(Item).filter_by(id=6000).one().versions[-1].transaction_id
+
+        with statements() as issued:
+            assert continuum.revert_transaction(bad, models=[Item, Document]) == {Item: 3}
+        db.session.commit()
+        assert len(issued) < 15
+
+        # rows restored and revert recorded as new versions
+        a = db.session.query(Item).filter_by(id=6000).one()
+        assert a.name == 'revert a'
+        assert [x.name for x in a.records] == ['revert a', 'revert a bad', 'revert a']
+        assert db.session.query(Item).filter_by(id=6001).one().name == 'revert b'
+        assert db.session.query(Item).filter_by(id=6002).first() is None
+        ItemVersion = version_class(Item)
+        versions = db.session.query(ItemVersion).filter(ItemVersion.id.in_([6000, 6001, 6002])).filter(
+            ItemVersion.transaction_id > bad).order_by(ItemVersion.id).all()
+        assert [x.operation_type for x in versions] == [Operation.UPDATE, Operation.INSERT, Operation.DELETE]
+        assert all(x.end_transaction_id is None for x in versions)
+        assert versions[0].previous.end_transaction_id == versions[0].transaction_id
+        return
+
+    def test_revert_to(self, client):
+        item = ItemFactory.create(id=6100, name='revert to 0')
+        other = ItemFactory.create(id=6101, name='revert to other 0')
+        start = item.versions[-1].transaction_id
+        for idx in range(1, 3):
+            item.name = 'revert to {}'.format(idx)
+            other.name = 'revert to other {}'.format(idx)
+            db.session.commit()
+
+        # criteria limit reverted rows
+        ItemVersion = version_class(Item)
+        assert continuum.revert_to(Item, start, criteria=[ItemVersion.id == 6100]) == 1
+        db.session.commit()
+        assert db.session.query(Item).filter_by(id=6100).one().name == 'revert to 0'
+        assert db.session.query(Item).filter_by(id=6101).one().name == 'revert to other 2'
+        assert continuum.revert_to(Item, 10 ** 9) == 0
+        return
+
+    def test_bulk_binds(self, client, monkeypatch):
+        session = db.session()
+        connection, mappers = session.connection, []
+
+        def track(*args, **kwargs):
+            caller = sys._getframe(1)
+            while caller.f_globals['__name__'] == 'sqlalchemy.orm.scoping':
+                caller = caller.f_back
+            if caller.f_globals['__name__'] == bulk.__name__:
+                mappers.append(kwargs.get('mapper'))
+            return connection(*args, **kwargs)
+
+        # connections are resolved per model, for __bind_key__
+        monkeypatch.setattr(session, 'connection', track)
+        continuum.bulk_insert(Item, [dict(id=6300, name='bulk binds 0')])
+        db.session.commit()
+        tx = db.session.query(Item).filter_by(id=6300).one().versions[-1].transaction_id
+        assert continuum.revert_to(Item, tx) == 0
+        assert continuum.revert_transaction(tx, models=[Item]) == {Item: 1}
+        db.session.commit()
+        assert mappers and None not in mappers
+        return
+
+    def test_paused(self, client):
+        a = ItemFactory.create(id=6200, name='paused a')
+        doc = DocumentFactory.create(name='paused doc')
+        Transaction = versioning_manager.transaction_cls
+        transactions = db.session.query(Transaction).count()
+
+        # no versions or transactions for paused models
+        with continuum.paused(models=[Item]):
+            a.name = 'paused a 2'
+            db.session.commit()
+            db.session.add(Item(id=6201, name='paused b'))
+        db.session.commit()
+        assert db.session.query(Transaction).count() == transactions
+        assert [x.name for x in a.records] == ['paused a']
+        assert not db.session.query(Item).filter_by(id=6201).one().modified
+
+        # other models keep versioning
+        with continuum.paused(models=[Item]):
+            doc.name = 'paused doc 2'
+        db.session.commit()
+        assert [x.name for x in doc.records] == ['paused doc', 'paused doc 2']
+
+        # summarizing versions written at end of block
+        with continuum.paused(summarize=True):
+            for idx in range(3):
+                a.name = 'paused a summary {}'.format(idx)
+                db.session.commit()
+            db.session.delete(db.session.query(Item).filter_by(id=6201).one())
+            db.session.add(Item(id=6202, name='paused c'))
+        db.session.commit()
+        assert db.session.query(Transaction).count() == transactions + 2
+        a = db.session.query(Item).filter_by(id=6200).one()
+        assert [x.name for x in a.records] == ['paused a', 'paused a summary 2']
+        assert [x.name for x in db.session.query(Item).filter_by(id=6202).one().records] == ['paused c']
+        ItemVersion = version_class(Item)
+        assert db.session.query(ItemVersion).filter_by(id=6201).count() == 0
+        return
+
+    def test_coalesce(self, client):
+        note = Note(id=1, name='coalesce 0')
+        db.session.add(note)
+        db.session.commit()
+
+        # rapid updates amend the latest version, without new transactions
+        Transaction = versioning_manager.transaction_cls
+        transactions = db.session.query(Transaction).count()
+        for idx in range(1, 4):
+            note.name = 'coalesce {}'.format(idx)
+            db.session.commit()
+        assert [x.name for x in note.records] == ['coalesce 3']
+        assert db.session.query(Transaction).count() == transactions
+
+        # updates outside of the window create new versions
+        db.session.query(Transaction).filter_by(id=note.versions[-1].transaction_id).update(
+            dict(issued_at=datetime.utcnow() - timedelta(minutes=5)))
+        db.session.commit()
+        note.name = 'coalesce 4'
+        db.session.commit()
+        note.name = 'coalesce 5'
+        db.session.commit()
+        assert [x.name for x in note.records] == ['coalesce 3', 'coalesce 5']
+        assert note.versions[0].end_transaction_id == note.versions[1].transaction_id
+        return
+
+    def test_as_of(self, client):
+        item = ItemFactory.create(name='as of 1')
+        other = ItemFactory.create(name='as of other')
+        first = item.versions[0].transaction_id
+        item.name = 'as of 2'
+        db.session.commit()
+        second = item.versions[1].transaction_id
+        db.session.delete(other)
+        db.session.commit()
+
+        def names(query):
+            return sorted(x.name for x in query.all() if x.name.startswith('as of'))
+
+        # state at transactions
+        assert names(Item.as_of(transaction_id=first)) == ['as of 1']
+        assert names(Item.as_of(transaction_id=first + 1)) == ['as of 1', 'as of other']
+        assert names(Item.as_of(transaction_id=second)) == ['as of 2', 'as of other']
+        assert names(Item.as_of(transaction_id=second + 1)) == ['as of 2']
+
+        # state at timestamps
+        from sqlalchemy_continuum import transaction_class
+        Transaction = transaction_class(Item)
+        issued = db.session.query(Transaction).get(second).issued_at
+        assert names(Item.as_of(timestamp=issued)) == ['as of 2', 'as of other']
+        return
@@ -0,0 +1,182 @@
+# -*- coding: utf-8 -*-
+#
+# Testing for replica history reads
+#
+# ------------------------------------------------
+
+
+# imports
+# -------
+import io
+import os
+import json
+import pytest
+from contextlib import contextmanager
+from sqlalchemy import create_engine, event
+
+from flask_continuum.cache import MemoryCache
+from flask_continuum.export import export_history
+
+from . import SANDBOX
+from .fixtures import db, configured, statements, Item, ItemFactory
+
+
+# helpers
+# -------
+@contextmanager
+def replicated(**options):
+    """
+    Configure extension reading history from a replica file, which
+    is synced with the primary database on demand.
+    """
+    engine = create_engine('sqlite:///{}'.format(os.path.join(SANDBOX, 'replica.db')))
+    issued = []
+
+    def track(conn, cursor, statement, parameters, context, executemany):
+        issued.append(statement)
+        return
+
+    def sync():
+        """
+        Copy primary database to replica file.
+        """
+        source, target = db.engine.raw_connection(), engine.raw_connection()
+        try:
+            source.connection.backup(target.connection)
+        finally:
+            source.close()
+            target.close()
+        return
+
+    event.listen(engine, 'before_cursor_execute', track)
+    with configured(read_engine=engine, **options) as ext:
+        replica = ext.replica
+        replica.issued = issued
+        replica.sync = sync
+        sync()
+        yield replica
+    engine.dispose()
+    return
+
+
+# fixtures
+# --------
+@pytest.fixture
+def replica(client):
+    with replicated() as replica:
+        yield replica
+    return
+
+
+# session
+# -------
+class TestReplica(object):
+
+    def test_records(self, client, replica):
+        item = ItemFactory.create(name='replica 1')
+        item.name = 'replica 2'
+        db.session.commit()
+        replica.sync()
+
+        # changes not yet replicated aren't visible
+        item.name = 'replica 3'
+        db.session.commit()
+        assert item.name == 'replica 3'
+        with statements() as issued:
+            records = item.records
+            assert item.modified
+            assert len(item.history) == 2
+        assert issued == []
+        assert [x.name for x in records] == ['replica 1', 'replica 2']
+        assert len(replica.issued) == 3
+
+        # replicas are read with a new snapshot per transaction
+        replica.sync()
+        db.session.commit()
+        assert [x.name for x in item.records] == ['replica 1', 'replica 2', 'replica 3']
+        assert [x.name for x in Item.history_for([item])[item.id]] == ['replica 1', 'replica 2', 'replica 3']
+        return
+
+    def test_read_your_writes(self, client, replica):
+        item = ItemFactory.create(name='replica writes 1')
+        replica.sync()
+        db.session.commit()
+
+        # flushed changes are read from the primary
+        item.name = 'replica writes 2'
+        db.session.flush()
+        del replica.issued[:]
+        assert [x.name for x in item.records] == ['replica writes 1', 'replica writes 2']
+        assert replica.issued == []
+        db.session.commit()
+        return
+
+    def test_revert(self, client, replica):
+        item = ItemFactory.create(name='replica revert 1')
+        item.name = 'replica revert 2'
+        db.session.commit()
+        replica.sync()
+        db.session.commit()
+
+        # reverts are written to the primary
+        record = item.records[0]
+        record.revert()
+        db.session.commit()
+        assert db.session.query(Item).filter_by(id=item.id).one().name == 'replica revert 1'
+
+        reader = replica.session(db.session)
+        with pytest.raises(AssertionError):
+            reader.add(Item(name='replica revert 3'))
+            reader.flush()
+        reader.rollback()
+        return
+
+    def test_records_after_commit(self, client, replica):
+        item = ItemFactory.create(name='replica commit 1')
+        item.name = 'replica commit 2'
+        db.session.commit()
+        replica.sync()
+        db.session.commit()
+
+        # records outlive the replica session they were read with
+        records = item.records
+        db.session.commit()
+        assert records[0].next.name == 'replica commit 2'
+        assert records[1].index == item.versions[1].index
+        records[0].revert()
+        db.session.commit()
+        assert db.session.query(Item).filter_by(id=item.id).one().name == 'replica commit 1'
+        return
+
+    def test_export(self, client, replica):
+        item = ItemFactory.create(name='replica export 1')
+        replica.sync()
+        item.name = 'replica export 2'
+        db.session.commit()
+
+        stream = io.StringIO()
+        export_history(db.session, [Item], stream)
+        names = [json.loads(x)['name'] for x in stream.getvalue().splitlines()]
+        assert 'replica export 1' in names
+        assert 'replica export 2' not in names
+        return
+
+    def test_cache(self, client):
+        with replicated(cache=MemoryCache()) as replica:
+            item = ItemFactory.create(name='replica cache 1')
+            replica.sync()
+            item.name = 'replica cache 2'
+            db.session.commit()
+
+            # histories read from a lagging replica aren't cached
+            assert [x.name for x in item.records] == ['replica cache 1']
+            replica.sync()
+            db.session.commit()
+            assert [x.name for x in item.records] == ['replica cache 1', 'replica cache 2']
+
+            # while current ones are
+            db.session.commit()
+            del replica.issued[:]
+            assert [x.name for x in item.records] == ['replica cache 1', 'replica cache 2']
+            assert replica.issued == []
+        return
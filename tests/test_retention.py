@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+#
+# Testing for history retention
+#
+# ------------------------------------------------
+
+
+# imports
+# -------
+from datetime import datetime, timedelta
+from sqlalchemy_continuum import transaction_class
+from flask_continuum.retention import compaction, expired
+
+from .fixtures import db, continuum, Item, ItemFactory
+
+
+# helpers
+# -------
+def create(name, updates):
+    item = ItemFactory.create(name='{} 0'.format(name))
+    for idx in range(1, updates + 1):
+        item.name = '{} {}'.format(name, idx)
+        db.session.commit()
+    return item.id
+
+
+def names(ident):
+    item = db.session.query(Item).filter_by(id=ident).one()
+    return [x.name for x in item.records]
+
+
+# session
+# -------
+class TestRetention(object):
+
+    def test_expired(self):
+        now = datetime(2020, 1, 10, 12)
+        day = timedelta(days=1)
+        versions = [
+            (1, now - 5 * day),
+            (2, now - 3 * day),
+            (3, now - 3 * day + timedelta(hours=1)),
+            (4, now),
+        ]
+        assert expired(versions, dict(keep_last=2), now) == set([1, 2])
+        assert expired(versions, dict(keep_last=0), now) == set([1, 2, 3])
+        assert expired(versions, dict(ttl=4 * day), now) == set([1])
+        assert expired(versions, dict(per_day=True), now) == set([2])
+        assert expired(versions[-1:], dict(ttl=timedelta(0)), now) == set()
+        return
+
+    def test_keep_last(self, client):
+        ident = create('retention keep', 5)
+        other = create('retention other', 1)
+        assert len(names(ident)) == 6
+
+        result = continuum.compact([Item], policy=dict(keep_last=2), chunk_size=2)
+        assert result[Item] >= 4
+        db.session.expire_all()
+        assert names(ident) == ['retention keep 4', 'retention keep 5']
+        assert names(other) == ['retention other 0', 'retention other 1']
+
+        # validity links are rebuilt
+        item = db.session.query(Item).filter_by(id=ident).one()
+        first, last = item.versions.all()
+        assert first.end_transaction_id == last.transaction_id
+        assert last.end_transaction_id is None
+        assert item.records[1].previous.name == 'retention keep 4'
+        assert item.records[0].next.name == 'retention keep 5'
+        return
+
+    def test_ttl_resume(self, client):
+        ident = create('retention ttl', 2)
+        item = db.session.query(Item).filter_by(id=ident).one()
+        Transaction = transaction_class(Item)
+        latest = item.versions[-1].transaction_id
+        issued = db.session.query(Transaction).get(latest).issued_at
+
+        # resume after previous rows
+        chunks = list(compaction(
+            db.session, Item, policy=dict(ttl=timedelta(0)),
+            after=(ident - 1,), now=issued,
+        ))
+        assert chunks[0]['last'] >= (ident,)
+        assert chunks[0]['deleted'] >= 2
+        assert names(ident) == ['retention ttl 2']
+        return
@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+#
+# Testing for sparse version storage
+#
+# ------------------------------------------------
+
+
+# imports
+# -------
+import pytest
+from sqlalchemy_continuum import version_class
+
+from .fixtures import db, continuum, Document, DocumentFactory
+
+
+# session
+# -------
+class TestSparse(object):
+
+    def test_storage(self, client):
+        doc = DocumentFactory.create(name='sparse 1', content='long content')
+        doc.name = 'sparse 2'
+        db.session.commit()
+        doc.content = None
+        db.session.commit()
+
+        # only changed columns are stored
+        DocumentVersion = version_class(Document)
+        first, second, third = db.session.query(DocumentVersion).filter_by(id=doc.id).order_by(DocumentVersion.transaction_id)
+        assert (first.name, first.content) == ('sparse 1', 'long content')
+        assert (second.name, second.content) == ('sparse 2', None)
+        assert second.changed_columns == 'id,name'
+        assert (third.name, third.content) == (None, None)
+        assert third.changed_columns == 'content,id'
+        return
+
+    def test_records(self, client):
+        doc = DocumentFactory.create(name='sparse records 1', content='content 1')
+        doc.name = 'sparse records 2'
+        db.session.commit()
+        doc.content = 'content 2'
+        db.session.commit()
+        doc = db.session.query(Document).filter_by(id=doc.id).one()
+
+        # full rows are reconstructed
+        records = doc.records
+        assert [(x.name, x.content) for x in records] == [
+            ('sparse records 1', 'content 1'),
+            ('sparse records 2', 'content 1'),
+            ('sparse records 2', 'content 2'),
+        ]
+        assert records[1].changeset == dict(name=['sparse records 1', 'sparse records 2'])
+        assert records[2].changeset == dict(content=['content 1', 'content 2'])
+        assert list(doc.changesets().values()) == [x.changeset for x in records]
+
+        # windows and bulk loading reconstruct too
+        assert [x.content for x in doc.history[-2:]] == ['content 1', 'content 2']
+        assert doc.history[1].content == 'content 1'
+        assert [x.content for x in reversed(doc.history)] == ['content 2', 'content 1', 'content 1']
+        assert [x.name for x in Document.history_for([doc])[doc.id]] == [x.name for x in records]
+
+        # revert restores full row
+        records[1].revert()
+        db.session.commit()
+        doc = db.session.query(Document).filter_by(id=doc.id).one()
+        assert (doc.name, doc.content) == ('sparse records 2', 'content 1')
+        assert [x.content for x in doc.records][-1] == 'content 1'
+        return
+
+    def test_as_of(self, client):
+        doc = DocumentFactory.create(name='sparse as of 1', content='big content')
+        doc.name = 'sparse as of 2'
+        db.session.commit()
+
+        # version rows can't be read as full rows
+        with pytest.raises(AssertionError):
+            Document.as_of(transaction_id=doc.records[-1].transaction_id)
+        return
+
+    def test_bulk_insert(self, client):
+        continuum.bulk_insert(Document, [dict(id=7000, name='sparse bulk', content='bulk')])
+        db.session.commit()
+        doc = db.session.query(Document).filter_by(id=7000).one()
+        doc.name = 'sparse bulk 2'
+        db.session.commit()
+        assert [(x.name, x.content) for x in doc.records] == [('sparse bulk', 'bulk'), ('sparse bulk 2', 'bulk')]
+        return
+
+    def test_compact(self, client):
+        doc = DocumentFactory.create(name='sparse compact 1', content='kept content')
+        for idx in range(2, 5):
+            doc.name = 'sparse compact {}'.format(idx)
+            db.session.commit()
+
+        # dropped columns are folded into retained versions
+        assert continuum.compact([Document], policy=dict(keep_last=2))[Document] >= 2
+        doc = db.session.query(Document).filter_by(id=doc.id).one()
+        assert [(x.name, x.content) for x in doc.records] == [
+            ('sparse compact 3', 'kept content'),
+            ('sparse compact 4', 'kept content'),
+        ]
+        return
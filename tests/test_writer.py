@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+#
+# Testing for deferred version writing
+#
+# ------------------------------------------------
+
+
+# imports
+# -------
+import time
+import pytest
+from datetime import datetime
+from sqlalchemy_continuum import version_class, versioning_manager
+from flask_continuum.cache import MemoryCache
+from flask_continuum.writer import DeferredUnitOfWork
+
+from .fixtures import app, db, configured, Item, ItemFactory, statements
+
+
+# fixtures
+# --------
+@pytest.fixture
+def writer(client):
+    with configured(deferred=True, queue_size=10, flush_interval=60) as ext:
+        yield ext.writer
+    return
+
+
+# session
+# -------
+class TestDeferred(object):
+
+    def test_deferred_versions(self, writer):
+        ItemVersion = version_class(Item)
+
+        # no versioning writes during flush
+        start = datetime.utcnow()
+        with statements() as issued:
+            item = ItemFactory.create(name='deferred 1')
+        assert not any('item_version' in x or 'transaction' in x for x in issued)
+        end = datetime.utcnow()
+        time.sleep(0.01)
+        item.name = 'deferred 2'
+        db.session.commit()
+        ident = item.id
+
+        # versions are written when queue is drained
+        writer.drain()
+        db.session.expire_all()
+        versions = db.session.query(ItemVersion).filter_by(id=ident).order_by(ItemVersion.transaction_id).all()
+        assert [x.name for x in versions] == ['deferred 1', 'deferred 2']
+        assert versions[0].end_transaction_id == versions[1].transaction_id
+        assert versions[1].end_transaction_id is None
+        assert versions[0].transaction_id != versions[1].transaction_id
+        assert start <= versions[0].transaction.issued_at <= end
+
+        # records are available afterwards
+        item = db.session.query(Item).filter_by(id=ident).one()
+        assert [x.name for x in item.records] == ['deferred 1', 'deferred 2']
+        return
+
+    def test_rollback(self, writer):
+        item = Item(name='deferred rollback')
+        db.session.add(item)
+        db.session.flush()
+        db.session.rollback()
+        writer.drain()
+        assert writer.queue.empty()
+        return
+
+    def test_cache(self, client):
+        with configured(deferred=True, flush_interval=60, cache=MemoryCache()) as ext:
+            item = ItemFactory.create(name='deferred cache 1')
+            ext.drain()
+            item.name = 'deferred cache 2'
+            db.session.commit()
+
+            # histories read before versions are written are dropped
+            assert [x.name for x in item.records] == ['deferred cache 1']
+            ext.drain()
+            assert [x.name for x in item.records] == ['deferred cache 1', 'deferred cache 2']
+        return
+
+    def test_applications(self, writer):
+        assert versioning_manager.uow_class is DeferredUnitOfWork
+        assert app.extensions['continuum'].writer is None
+        ident = ItemFactory.create(name='deferred app 1').id
+
+        # other applications write versions synchronously
+        with app.app_context():
+            db.session.remove()
+            item = ItemFactory.create(name='deferred app 2')
+            assert [x.name for x in item.records] == ['deferred app 2']
+            db.session.remove()
+
+        writer.drain()
+        item = db.session.query(Item).filter_by(id=ident).one()
+        assert [x.name for x in item.records] == ['deferred app 1']
+        return